@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+dir = os.path.dirname(os.path.abspath(__file__))
+if not dir in sys.path:
+    sys.path.append(dir)
+
+# Runs MapImporter.import_map + generate_geo for every job of a job file, each
+# job in its own background Blender process:
+#
+#   python batch_geo.py jobs.json --blender path/to/blender --max-jobs 2
+#
+# jobs.json:
+# {
+#     "blend_file": "template.blend",            (optional, opened before the job)
+#     "jobs": [
+#         {
+#             "name": "rucmia",                  (optional, defaults to the map)
+#             "source_dir": "E:/TERA_DEV/test_re_export/cli",
+#             "map": "Rucmia_P",
+#             "origin": [1000, 1000],            (optional, continent origin)
+#             "zones": [[993, 1008]],            (and/or)
+#             "zone_range": [[990, 995], [1005, 1010]],  (inclusive x and y ranges)
+#             "output_dir": "E:/TERA_DEV/geo",
+#             "import": {"import_meshes": false},         (import_map arguments)
+#             "geo": {"workers": 4, "incremental": true}  (generate_geo arguments)
+#         }
+#     ]
+# }
+
+RUN_JOB_ARG = "--run-job"
+
+
+def load_jobs(job_file: str):
+    with open(job_file, "r") as f:
+        config = json.load(f)
+
+    jobs = config["jobs"]
+    for i, job in enumerate(jobs):
+        job.setdefault("name", f"{i}_{job['map']}")
+        job.setdefault("origin", [1000, 1000])
+        job.setdefault("import", {})
+        job.setdefault("geo", {})
+    return config, jobs
+
+
+def get_job_zones(job: dict):
+    zones = [tuple(zone) for zone in job.get("zones", [])]
+    if "zone_range" in job:
+        (x_min, x_max), (y_min, y_max) = job["zone_range"]
+        zones += [
+            (x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1)
+        ]
+    return list(dict.fromkeys(zones))
+
+
+def run_job(job: dict):
+    # inside Blender: import the map once, then generate every zone of the job
+    from lib.map_importer import MapImporter
+    from lib.ray_cast import generate_geo
+    from lib.topology import Point2D
+    from lib.printer import Printer
+
+    P = Printer()
+
+    importer = MapImporter(job["source_dir"], job["map"])
+    importer.import_map(**job["import"])
+
+    geo_options = {"draw_z": False, "draw_h": False}
+    geo_options.update(job["geo"])
+
+    os.makedirs(job["output_dir"], exist_ok=True)
+    origin = Point2D(*job["origin"])
+    zones = get_job_zones(job)
+    for i, (x, y) in enumerate(zones):
+        P.print(f"JOB > {job['name']} | zone {i + 1} of {len(zones)} ({x}:{y})")
+        generate_geo(job["map"], Point2D(x, y), origin, job["output_dir"], **geo_options)
+
+
+def start_job(
+    blender: str, blend_file: str, job_file: str, job_idx: int, job: dict, log_dir: str
+):
+    # fresh background Blender per job, so its memory is given back when it ends
+    cmd = [blender, "-b"]
+    if blend_file is not None:
+        cmd.append(blend_file)
+    cmd += [
+        "--python-exit-code",
+        "1",
+        "--python",
+        os.path.abspath(__file__),
+        "--",
+        RUN_JOB_ARG,
+        os.path.abspath(job_file),
+        str(job_idx),
+    ]
+
+    log_path = os.path.join(log_dir, f"{job['name']}.log")
+    start = time.time()
+    with open(log_path, "w") as log:
+        code = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+    return {
+        "name": job["name"],
+        "map": job["map"],
+        "zones": len(get_job_zones(job)),
+        "code": code,
+        "time": time.time() - start,
+        "log": log_path,
+    }
+
+
+def run_batch(job_file: str, blender: str, max_jobs: int, log_dir: str = None):
+    from lib.utils import Utils
+
+    config, jobs = load_jobs(job_file)
+    blend_file = config.get("blend_file")
+    if log_dir is None:
+        log_dir = os.path.join(os.path.dirname(os.path.abspath(job_file)), "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        futures = [
+            executor.submit(start_job, blender, blend_file, job_file, i, job, log_dir)
+            for i, job in enumerate(jobs)
+        ]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            status = "OK" if result["code"] == 0 else f"FAILED ({result['code']})"
+            print(
+                f"JOB > {result['name']} | {result['map']} | {result['zones']} zones | {status} | {Utils.time_convert(result['time'])} | {result['log']}"
+            )
+
+    failed = [result for result in results if result["code"] != 0]
+    print(
+        f"BATCH > {len(results) - len(failed)} of {len(results)} jobs done in {Utils.time_convert(time.time() - start)}"
+    )
+    for result in failed:
+        print(f"  {result['name']} failed, see {result['log']}")
+
+    return len(failed) == 0
+
+
+parser = argparse.ArgumentParser(
+    description="Import maps and generate .idx/.geo for every job of a job file, one background Blender per job"
+)
+parser.add_argument("job_file", help="json file listing the jobs, see batch_geo.py")
+parser.add_argument(
+    "--blender",
+    default=os.environ.get("BLENDER", "blender"),
+    help="blender executable (default: $BLENDER or blender)",
+)
+parser.add_argument(
+    "--max-jobs", type=int, default=1, help="jobs running at the same time"
+)
+parser.add_argument(
+    "--log-dir", default=None, help="job logs directory (default: logs/ next to the job file)"
+)
+
+if __name__ == "__main__":
+    if RUN_JOB_ARG in sys.argv:
+        # started by start_job: blender -b --python batch_geo.py -- --run-job file idx
+        job_file, job_idx = sys.argv[sys.argv.index(RUN_JOB_ARG) + 1 :][:2]
+        run_job(load_jobs(job_file)[1][int(job_idx)])
+    else:
+        args = parser.parse_args()
+        sys.exit(0 if run_batch(args.job_file, args.blender, args.max_jobs, args.log_dir) else 1)
@@ -0,0 +1,30 @@
+import argparse
+import os
+import sys
+
+dir = os.path.dirname(os.path.abspath(__file__))
+if not dir in sys.path:
+    sys.path.append(dir)
+
+from lib.geo_headless import generate_geo_headless
+
+parser = argparse.ArgumentParser(
+    description="Generate .idx/.geo from a triangle soup exported by GeoGenerator.export_triangles"
+)
+parser.add_argument("soup", help="path of the exported .npz triangle soup")
+parser.add_argument(
+    "export_path",
+    nargs="?",
+    default=None,
+    help="output directory for the .idx/.geo files",
+)
+parser.add_argument(
+    "--workers", type=int, default=1, help="worker processes to shard the zone across"
+)
+parser.add_argument(
+    "--cells", default=None, help="also save the generated cells to this .npz"
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    generate_geo_headless(args.soup, args.export_path, args.workers, args.cells)
@@ -14,4 +14,4 @@ map = 'HNC_A_P'
 importer = MapImporter(
     source_dir="E:\\TERA_DEV\\test_re_export\\cli", map_name=map
 )
-importer.import_map(import_meshes=True, import_agg_geoms=False, hide=True)
+importer.import_map(import_meshes=True, import_agg_geoms=False, hide=True, terrain_meshes=True)
@@ -1,32 +1,24 @@
-import array
 from lib.topology import * 
+from lib.topology_file import ZoneReader
+from lib.topology_archive import TopologyArchive
+from lib.area_list import AreaList
+from lib.zone_cache import ZONE_CACHE
+from lib.globals import ZONE_SIZE
 import bpy
-from mathutils import Vector
-import math
-import xml.etree.ElementTree as ET
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
 
 # -------------------------------------------------------------- #
 
+TOPOLOGY_PATH = "E:\\TERA_DEV\\Server\\Topology"
 AREA_LIST_PATH = "E:\\TERA_DEV\\Server\\Executable\\Bin\\Datasheet\\AreaList.xml"
-AREALIST = ET.parse(AREA_LIST_PATH).getroot()
-CONTINENTS = AREALIST.findall("Continent")
-
-def get_continent(id):
-    ret = None
-    for continent in CONTINENTS:
-        if int(continent.attrib.get("id")) == id:
-            ret = continent
-            break
-
-    return ret
+AREA_LIST = AreaList.load(AREA_LIST_PATH)
 
 def get_continent_origin(continent_id):
-    continent = get_continent(continent_id)
-    return Point2D(
-        int(continent.attrib.get("originZoneX")),
-        int(continent.attrib.get("originZoneY")),
-    )
+    return AREA_LIST.get_continent_origin(continent_id)
 
 
 # def create_empties():
@@ -52,133 +44,145 @@ def get_continent_origin(continent_id):
 #         print(f"Added square{square.x} {square.y}")
 
 
-def create_volumes(squares, onlyFirst):
-    volumes = []
+def bucket_volumes(zone):
+    data = zone.data
+
+    x = (16 / 10) * (data.cell_x + data.square_x.astype(np.int32) * 8 + 0.5 - 120 * 8)
+    y = (16 / 10) * (data.cell_y + data.square_y.astype(np.int32) * 8 + 0.5)
+    z = data.z / 10
 
-    r = range(0, 20)  # todo: get max from squares
+    # bake the old object transform (scale 0.1, 90° rotation, zone offset) and the
+    # pivot it was parented to (scale -4/-4/4, 90° rotation) into the points
+    zone_offset = ZONE_SIZE * 0.01 * 4
+    points = np.empty((len(data), 3), dtype=np.float32)
+    points[:, 0] = zone_offset * (zone.position.y - zone.origin.y + 1) + 0.4 * x
+    points[:, 1] = zone_offset * (zone.position.x - zone.origin.x) + 0.4 * y
+    points[:, 2] = 0.4 * z
+
+    # one stable sort groups the entries by volume, keeping square/cell order
+    order = np.argsort(data.volume_idx, kind="stable")
+    counts = np.bincount(data.volume_idx, minlength=data.max_volumes)
+    return np.split(points[order], np.cumsum(counts)[:-1])
+
+
+def create_volumes(zone, onlyFirst):
+    buckets = bucket_volumes(zone)
     if onlyFirst:
-        r = range(0, 1)
-    for volumeIdx in r:
-        volume = Volume(volumeIdx)
-        volumes.append(volume)
-        for square in squares:
-            for cell in square.cells:
-                if cell.volume_idx == volumeIdx:
-                    volume.cells.append(
-                        Point3D(
-                            (16 / 10) * (cell.x + square.x * 8 + 0.5 - 120 * 8),
-                            (16 / 10) * (cell.y + square.y * 8 + 0.5),
-                            (cell.z) / 10,
-                        )
-                    )
-    return volumes
+        buckets = buckets[0:1]
+
+    return [Volume(volumeIdx, points) for volumeIdx, points in enumerate(buckets)]
 
 def create_point_clouds(zone):
-    volumes = create_volumes(zone.squares, False)
+    volumes = create_volumes(zone, False)
 
     for volume in volumes:
-        if len(volume.cells) == 0:
+        if len(volume.points) == 0:
             continue
         mesh = bpy.data.meshes.new(f"Volume{volume.index}")
-
-        vectors = []
-        for point in volume.cells:
-            vectors.append(Vector([point.x, point.y, point.z]))
-
-        mesh.from_pydata(vectors, [], [])
+        mesh.vertices.add(len(volume.points))
+        mesh.vertices.foreach_set("co", volume.points.ravel())
+        mesh.update()
 
         obj = bpy.data.objects.new(f"Volume{volume.index}", mesh)
         bpy.context.scene.collection.objects.link(obj)
 
-        scale = 0.1
-        obj.scale.x *= scale
-        obj.scale.y *= scale
-        obj.scale.z *= scale
-
-        obj.location.x = -(zone.position.x - zone.origin.x) * 15360 * 0.01
-        obj.location.y = (zone.position.y - zone.origin.y + 1) * 15360 * 0.01
-
-        obj.rotation_euler[2] = math.radians(90)
-
-        # rotate and scale
-
-        pivot = bpy.data.objects.new('Pivot', None)
-        bpy.context.scene.collection.objects.link(pivot)
-        obj.parent = pivot
-
-        pivot.scale.x *= 4 * (-1)
-        pivot.scale.y *= 4 * (-1)
-        pivot.scale.z *= 4
+def get_continent_zones(continent_id):
+    return AREA_LIST.get_continent_zones(continent_id)
 
-        pivot.rotation_euler[2] = math.radians(90)
+def get_archive_path(continent_id):
+    return os.path.join(TOPOLOGY_PATH, f"Continent_{continent_id}.topo")
 
-        bpy.context.evaluated_depsgraph_get().update()
-        for child in pivot.children:
-            pwm = child.matrix_world.copy()
-            child.parent = None
-            child.matrix_world = pwm
-
-        bpy.data.objects.remove(bpy.data.objects[pivot.name])
-
-def load_zone(position, origin):
-    idx_path = f"E:\\TERA_DEV\\Server\\Topology\\x{position.x}y{position.y}.idx"
-    geo_path = f"E:\\TERA_DEV\\Server\\Topology\\x{position.x}y{position.y}.geo"
-
-    squares = []
-
-    with open(idx_path, "rb") as idx:
-        for squareY in range(120):
-            for squareX in range(120):
-                geoDataCount = array.array("I", idx.read(4))[0]
-                volumes_per_cell = array.array("H", idx.read(128))
-                squares.append(Square(squareX, squareY, geoDataCount, volumes_per_cell))
-
-    with open(geo_path, "rb") as geo:
-        for square in squares:
-            for cellY in range(8):
-                for cellX in range(8):
-                    for volume_idx in range(square.volumes_per_cell[cellY * 8 + cellX]):
-                        geoPair = array.array("H", geo.read(4))
-                        square.add_cell(
-                            Cell(cellX, cellY, geoPair[0], geoPair[1], volume_idx)
-                        )
+def pack_continent(continent_id):
+    archive_path = get_archive_path(continent_id)
+    count = TopologyArchive.pack(
+        TOPOLOGY_PATH, get_continent_zones(continent_id), archive_path
+    )
+    print(f"Packed {count} zones into {archive_path}")
+
+def get_zone_stamp(position, archive=None):
+    if archive is not None and archive.contains(position):
+        return os.stat(archive.archive_path).st_mtime_ns
+    return (
+        os.stat(os.path.join(TOPOLOGY_PATH, f"x{position.x}y{position.y}.idx")).st_mtime_ns,
+        os.stat(os.path.join(TOPOLOGY_PATH, f"x{position.x}y{position.y}.geo")).st_mtime_ns,
+    )
 
-    return Zone(squares, position, origin)
+def read_zone_data(position, archive=None):
+    if archive is not None and archive.contains(position):
+        reader = archive.open_zone(position)
+    else:
+        reader = ZoneReader.open(TOPOLOGY_PATH, position)
+    return ZoneData.from_reader(reader)
+
+def get_zone_archive(position, archive=None):
+    # the archive holding the zone, unless its files changed since it was packed
+    if archive is None or not archive.contains(position):
+        return None
+    if not archive.is_current(TOPOLOGY_PATH, position):
+        print(
+            f"x{position.x}y{position.y} changed since {archive.archive_path} was packed, loading its files"
+        )
+        return None
+    return archive
+
+def load_zone(continent_id, position, origin, archive=None):
+    archive = get_zone_archive(position, archive)
+    data = ZONE_CACHE.get_or_load(
+        (continent_id, position.x, position.y),
+        get_zone_stamp(position, archive),
+        lambda: read_zone_data(position, archive),
+    )
+    return Zone(data, position, origin)
 
-def load_topo(continent_id, min_x, max_x, min_y, max_y):
+def load_topo(continent_id, min_x, max_x, min_y, max_y, workers=None):
     origin = get_continent_origin(continent_id)
     print(f"origin is {origin.x},{origin.y}")
 
-    areas = get_continent(continent_id).findall("Area")
-    zone_list = []
-
-    for area in areas:
-        for zones in area.findall("Zones"):
-            for xml_zone in zones.findall("Zone"):
-                zone_list.append(xml_zone)
+    zone_list = get_continent_zones(continent_id)
 
     print(f"found {len(zone_list)} zones")
 
-    curr = 0
-
-    zones = []
-    for xml_zone in zone_list:
-        pos = Point2D(int(xml_zone.attrib.get("x")), int(xml_zone.attrib.get("y")))
+    positions = []
+    for pos in zone_list:
         if pos.x < min_x: continue
         if pos.x > max_x: continue
         if pos.y < min_y: continue
         if pos.y > max_y: continue
-
-        zone = load_zone(pos, origin)
-        zones.append(zone)
-
-        curr += 1
-        print(f"[{curr}/{len(zone_list)}] Loaded zone {pos.x},{pos.y}")
+        positions.append(pos)
+
+    # zone parsing is NumPy work on mapped files, which releases the GIL,
+    # so threads are enough; results are collected in submission order
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    archive_path = get_archive_path(continent_id)
+    archive_context = nullcontext()
+    if os.path.exists(archive_path):
+        try:
+            archive_context = TopologyArchive(archive_path)
+        except Exception as e:
+            print(f"{e}, loading zone files")
+
+    # zones keep copies of their data, so the archive mapping is released once
+    # they are read and the archive can be packed again in the same session
+    zones = []
+    with archive_context as archive, ThreadPoolExecutor(
+        max_workers=max(1, workers)
+    ) as executor:
+        futures = [
+            executor.submit(load_zone, continent_id, pos, origin, archive)
+            for pos in positions
+        ]
+        for curr, (pos, future) in enumerate(zip(positions, futures)):
+            zones.append(future.result())
+            print(f"[{curr + 1}/{len(positions)}] Loaded zone {pos.x},{pos.y}")
+
+    print(f"zone cache: {ZONE_CACHE.stats()}")
 
     return zones
 
-def create_topo(continent_id, min_x, max_x, min_y, max_y):
-    zones = load_topo(continent_id, min_x, max_x, min_y, max_y)
+def create_topo(continent_id, min_x, max_x, min_y, max_y, workers=None):
+    zones = load_topo(continent_id, min_x, max_x, min_y, max_y, workers)
 
     for zone in zones:
         create_point_clouds(zone)
@@ -0,0 +1,81 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+
+from lib.topology import Point2D
+
+CACHE_VERSION = 1
+
+
+class AreaList:
+    def __init__(self, origins: dict, zones: dict):
+        self.origins = origins  # continent_id : (origin_x, origin_y)
+        self.zones = zones  # continent_id : [(x, y), ...]
+
+    def parse(path: str):
+        origins = {}
+        zones = {}
+
+        continent_id = None
+        in_zones = False
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "Continent":
+                    continent_id = int(elem.attrib.get("id"))
+                    origins[continent_id] = (
+                        int(elem.attrib.get("originZoneX")),
+                        int(elem.attrib.get("originZoneY")),
+                    )
+                    zones[continent_id] = []
+                elif elem.tag == "Zones":
+                    in_zones = True
+                elif elem.tag == "Zone" and in_zones and continent_id is not None:
+                    zones[continent_id].append(
+                        (int(elem.attrib.get("x")), int(elem.attrib.get("y")))
+                    )
+            elif elem.tag == "Zones":
+                in_zones = False
+            elif elem.tag == "Continent":
+                continent_id = None
+                elem.clear()
+
+        return AreaList(origins, zones)
+
+    def load(path: str, cache_path: str = None):
+        if cache_path is None:
+            cache_path = f"{path}.cache.json"
+
+        stat = os.stat(path)
+        stamp = [CACHE_VERSION, stat.st_size, stat.st_mtime_ns]
+
+        try:
+            with open(cache_path, "r") as cache_file:
+                cache = json.load(cache_file)
+            if cache["stamp"] == stamp:
+                return AreaList(
+                    {int(k): tuple(v) for k, v in cache["origins"].items()},
+                    {int(k): [tuple(z) for z in v] for k, v in cache["zones"].items()},
+                )
+        except (OSError, ValueError, KeyError):
+            pass
+
+        ret = AreaList.parse(path)
+
+        try:
+            with open(cache_path, "w") as cache_file:
+                json.dump(
+                    {"stamp": stamp, "origins": ret.origins, "zones": ret.zones},
+                    cache_file,
+                    separators=(",", ":"),
+                )
+        except OSError:
+            pass
+
+        return ret
+
+    def get_continent_origin(self, continent_id: int):
+        x, y = self.origins[continent_id]
+        return Point2D(x, y)
+
+    def get_continent_zones(self, continent_id: int):
+        return [Point2D(x, y) for x, y in self.zones[continent_id]]
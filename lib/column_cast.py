@@ -0,0 +1,134 @@
+import array
+import bmesh
+from mathutils import bvhtree
+from mathutils import Vector
+from lib.geo_cache import hash_bytes
+from lib.geo_cells import z_tolerance
+from lib.heightfield import HeightField, is_heightfield
+
+DOWN = Vector((0, 0, -1))
+UP = Vector((0, 0, 1))
+
+SWEEP_STEP = 0.0001  # minimum restart distance below a hit when sweeping a column
+SWEEP_MAX_HITS = 4096  # per tree and column
+
+
+class HeightFieldTree:
+    # BVHTree.ray_cast over a terrain HeightField, for vertical rays
+    def __init__(self, heightfield: HeightField):
+        self.heightfield = heightfield
+
+    def ray_cast(self, origin, direction):
+        z, inside = self.heightfield.sample([origin.x], [origin.y])
+        z = float(z[0])
+        if not inside[0] or (z - origin.z) * direction.z < 0:
+            return None, None, None, None
+        return Vector((origin.x, origin.y, z)), UP, 0, abs(z - origin.z)
+
+
+class ColumnCaster:
+    def __init__(self, objects, depsgraph):
+        self.objects = []
+        self.trees = []
+        self.bounds = []  # (min_x, min_y, max_x, max_y) per tree, world space
+        self.tops = []  # max z per tree, world space
+        self.fingerprints = []  # hash of the world space geometry per tree
+
+        for obj in objects:
+            if obj.type != "MESH":
+                continue
+
+            if is_heightfield(obj):
+                # terrain: sampled from its heightmap, not its (modifier) mesh
+                heightfield = HeightField.from_object(obj)
+                self.objects.append(obj)
+                self.trees.append(HeightFieldTree(heightfield))
+                self.bounds.append(heightfield.bounds())
+                self.tops.append(heightfield.top())
+                self.fingerprints.append(hash_bytes(heightfield.fingerprint_bytes()))
+                continue
+
+            # evaluated geometry, like scene.ray_cast sees it
+            bm = bmesh.new()
+            bm.from_object(obj, depsgraph)
+            bm.transform(obj.matrix_world)
+
+            if len(bm.faces) != 0:
+                xs = [v.co.x for v in bm.verts]
+                ys = [v.co.y for v in bm.verts]
+                self.objects.append(obj)
+                self.trees.append(bvhtree.BVHTree.FromBMesh(bm))
+                self.bounds.append((min(xs), min(ys), max(xs), max(ys)))
+                self.tops.append(max(v.co.z for v in bm.verts))
+                self.fingerprints.append(
+                    hash_bytes(
+                        array.array("d", [c for v in bm.verts for c in v.co]).tobytes(),
+                        array.array(
+                            "i", [v.index for f in bm.faces for v in f.verts]
+                        ).tobytes(),
+                    )
+                )
+
+            bm.free()
+
+    def __candidates(self, x: float, y: float, candidates=None):
+        if candidates is None:
+            candidates = range(len(self.trees))
+        for i in candidates:
+            min_x, min_y, max_x, max_y = self.bounds[i]
+            if min_x <= x <= max_x and min_y <= y <= max_y:
+                yield i
+
+    def cast_column(self, x: float, y: float, z: float, candidates=None):
+        # first hit of every object below z, highest first: the same sequence
+        # casting the scene and hiding each hit object used to produce
+        origin = Vector((x, y, z))
+        hits = []
+        for i in self.__candidates(x, y, candidates):
+            location, normal, index, distance = self.trees[i].ray_cast(origin, DOWN)
+            if location is not None:
+                hits.append((location.z, i))
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return hits
+
+    def sweep_column(self, x: float, y: float, candidates=None):
+        # every hit along the column, highest first: each tree is cast from above
+        # its top, then again from just below every hit until it runs out
+        hits = []
+        for i in self.__candidates(x, y, candidates):
+            z = self.tops[i] + 1
+            last_z = None
+            for _ in range(SWEEP_MAX_HITS):
+                location, normal, index, distance = self.trees[i].ray_cast(
+                    Vector((x, y, z)), DOWN
+                )
+                # a restart rounded back onto the previous hit ends the sweep
+                # rather than finding it again
+                if location is None or (last_z is not None and location.z >= last_z):
+                    break
+                hits.append((location.z, i))
+                last_z = location.z
+                z = location.z - z_tolerance(location.z, SWEEP_STEP)
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return hits
+
+    def cast(self, x: float, y: float, z: float, z_dir: float = -1, candidates=None):
+        # nearest hit across all objects, like scene.ray_cast
+        origin = Vector((x, y, z))
+        direction = DOWN if z_dir < 0 else UP
+
+        nearest = None
+        nearest_distance = 0
+        for i in self.__candidates(x, y, candidates):
+            location, normal, index, distance = self.trees[i].ray_cast(
+                origin, direction
+            )
+            if location is not None and (nearest is None or distance < nearest_distance):
+                nearest = (location.z, i)
+                nearest_distance = distance
+
+        if nearest is None:
+            return False, 0, None
+        return True, nearest[0], self.objects[nearest[1]]
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+
+CACHE_VERSION = 3  # 3: float64 values
+
+
+def hash_bytes(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+
+def square_fingerprints(candidates, fingerprints):
+    # fingerprint of every square from those of the objects overlapping it;
+    # candidates: object indices per square, see square_candidates
+    ret = np.zeros((len(candidates), 16), dtype=np.uint8)
+    for i, objects in enumerate(candidates):
+        if len(objects) != 0:
+            ret[i] = np.frombuffer(
+                hash_bytes(*sorted(fingerprints[obj] for obj in objects)),
+                dtype=np.uint8,
+            )
+    return ret
+
+
+class SquareCache:
+    # per-square z/h results of a previous run, keyed by square fingerprints
+    def __init__(self, stamp, fingerprints, counts, z, w, h, cells_per_square):
+        self.stamp = stamp
+        self.fingerprints = fingerprints  # (squares, 16)
+        self.counts = counts  # values per cell, generator cell order
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.z = z
+        self.w = w
+        self.h = h
+        self.cells_per_square = cells_per_square
+
+    def load(path: str, stamp: str, cells_per_square: int):
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if str(data["stamp"]) != stamp:
+                    return None
+                return SquareCache(
+                    stamp,
+                    data["fingerprints"],
+                    data["counts"],
+                    data["z"],
+                    data["w"],
+                    data["h"],
+                    cells_per_square,
+                )
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # unreadable (e.g. truncated) cache: every square is generated again
+            return None
+
+    def save(path: str, stamp: str, fingerprints, cells):
+        # cells: CellVolumes with sorted volumes and their heights
+        # written next to the cache and moved over it, so an interrupted save
+        # leaves the previous cache rather than a truncated one
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    stamp=np.array(stamp),
+                    fingerprints=fingerprints,
+                    counts=cells.counts,
+                    z=cells.z[: cells.size],
+                    w=cells.w[: cells.size],
+                    h=cells.h[: cells.size],
+                )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def is_valid(self, square_idx: int, fingerprint):
+        return bytes(self.fingerprints[square_idx]) == bytes(fingerprint)
+
+    def restore_square(self, square_idx: int, cells):
+        # appends the square's volumes and heights to a CellVolumes
+        first = square_idx * self.cells_per_square
+        last = first + self.cells_per_square
+        start = self.offsets[first]
+        end = self.offsets[last]
+        cells.append_range(
+            first,
+            self.counts[first:last],
+            self.z[start:end],
+            self.w[start:end],
+            self.h[start:end],
+        )
@@ -0,0 +1,327 @@
+import bisect
+import time
+import numpy as np
+
+from lib.globals import MAX_Z
+from lib.printer import Printer
+from lib.topology_file import encode_geo_values, write_zone
+
+P = Printer()
+
+CEILING_TOLERANCE = 0.0001  # hits this close to a ceiling cast origin are ambiguous
+
+
+class CellGrid:
+    # cell centers of a zone, indexed by generator cell index
+    # ((sx * num_squares + sy) * num_cells + cx) * num_cells + cy
+    def __init__(self, rel_pos, size, num_squares, num_cells, scene_scale):
+        self.num_squares = num_squares
+        self.num_cells = num_cells
+
+        square_size = size / num_squares
+        cell_size = (square_size / num_cells) / scene_scale
+
+        # x only depends on (sx, cx) and y on (sy, cy): compute both axes with the
+        # exact float expression the per-cell code used, then broadcast
+        x_axis = np.array(
+            [
+                [
+                    round(
+                        (cx + 0.5) * cell_size
+                        + (sx * square_size + rel_pos.y * size) / scene_scale,
+                        3,
+                    )
+                    for cx in range(num_cells)
+                ]
+                for sx in range(num_squares)
+            ]
+        )
+        y_axis = np.array(
+            [
+                [
+                    round(
+                        (cy + 0.5) * cell_size
+                        + (sy * square_size + rel_pos.x * size) / scene_scale,
+                        3,
+                    )
+                    for cy in range(num_cells)
+                ]
+                for sy in range(num_squares)
+            ]
+        )
+
+        shape = (num_squares, num_squares, num_cells, num_cells)
+        self.x = np.broadcast_to(x_axis[:, None, :, None], shape).reshape(-1)
+        self.y = np.broadcast_to(y_axis[None, :, None, :], shape).reshape(-1)
+
+        # cell indices in .idx/.geo order: squares row by row (y outer), cells row by row
+        sy, sx, cy, cx = np.meshgrid(
+            np.arange(num_squares),
+            np.arange(num_squares),
+            np.arange(num_cells),
+            np.arange(num_cells),
+            indexing="ij",
+        )
+        self.export_order = (
+            ((sx * num_squares + sy) * num_cells + cx) * num_cells + cy
+        ).reshape(-1)
+
+    def __len__(self):
+        return len(self.x)
+
+    def square_cells(self, sx: int, sy: int):
+        start = (sx * self.num_squares + sy) * self.num_cells * self.num_cells
+        return slice(start, start + self.num_cells * self.num_cells)
+
+    def row_cells(self, sx: int):
+        start = sx * self.num_squares * self.num_cells * self.num_cells
+        return slice(start, start + self.num_squares * self.num_cells * self.num_cells)
+
+
+class CellVolumes:
+    # ragged per-cell volumes in generator cell order: a volume count per cell and
+    # flat z / wrapped / height buffers, filled in increasing cell index; float64,
+    # like the values are computed: export truncates them, so narrowing first
+    # could round a value up to the next encoded step
+    def __init__(self, num_cells_total: int, cells_per_square: int, dtype=np.float64):
+        self.cells_per_square = cells_per_square
+        self.counts = np.zeros(num_cells_total, dtype=np.uint16)
+        self.z = np.empty(0, dtype=dtype)
+        self.w = np.empty(0, dtype=dtype)
+        self.h = np.zeros(0, dtype=dtype)
+        self.size = 0  # values in use, the buffers grow geometrically
+        self.next_cell = 0  # first cell that can still be appended
+        self.__offsets = None
+
+    def __len__(self):
+        return self.size
+
+    def __reserve(self, size: int):
+        if size <= len(self.z):
+            return
+        capacity = max(size, 2 * len(self.z), 1024)
+        for name in ("z", "w", "h"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+
+    def append(self, cell_idx: int, z_values, w_values, h_values=None):
+        if cell_idx < self.next_cell:
+            raise ValueError(f"cell {cell_idx} appended after cell {self.next_cell - 1}")
+
+        count = len(z_values)
+        self.__reserve(self.size + count)
+        self.z[self.size : self.size + count] = z_values
+        self.w[self.size : self.size + count] = w_values
+        if h_values is not None:
+            self.h[self.size : self.size + count] = h_values
+        self.counts[cell_idx] = count
+        self.size += count
+        self.next_cell = cell_idx + 1
+        self.__offsets = None
+
+    def append_range(self, first_cell: int, counts, z, w, h=None):
+        # counts of the cells first_cell.. and their values, in cell order
+        if first_cell < self.next_cell:
+            raise ValueError(f"cell {first_cell} appended after cell {self.next_cell - 1}")
+
+        count = len(z)
+        self.__reserve(self.size + count)
+        self.z[self.size : self.size + count] = z
+        self.w[self.size : self.size + count] = w
+        if h is not None:
+            self.h[self.size : self.size + count] = h
+        self.counts[first_cell : first_cell + len(counts)] = counts
+        self.size += count
+        self.next_cell = first_cell + len(counts)
+        self.__offsets = None
+
+    def trim(self):
+        self.z = self.z[: self.size].copy()
+        self.w = self.w[: self.size].copy()
+        self.h = self.h[: self.size].copy()
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                counts=self.counts,
+                z=self.z[: self.size],
+                w=self.w[: self.size],
+                h=self.h[: self.size],
+            )
+
+    def load(path: str, cells_per_square: int):
+        with np.load(path) as data:
+            cells = CellVolumes(len(data["counts"]), cells_per_square, data["z"].dtype)
+            cells.append_range(0, data["counts"], data["z"], data["w"], data["h"])
+        cells.trim()
+        return cells
+
+    @property
+    def offsets(self):
+        # first value of every cell, plus the total
+        if self.__offsets is None:
+            self.__offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+            np.cumsum(self.counts, out=self.__offsets[1:])
+        return self.__offsets
+
+    def cell_range(self, cell_idx: int):
+        offsets = self.offsets
+        return int(offsets[cell_idx]), int(offsets[cell_idx + 1])
+
+    def square_range(self, square_idx: int):
+        first = square_idx * self.cells_per_square
+        if self.next_cell <= first + self.cells_per_square:
+            # nothing appended past this square: its values are the last ones
+            return self.size - int(self.square_counts(square_idx).sum()), self.size
+        offsets = self.offsets
+        return int(offsets[first]), int(offsets[first + self.cells_per_square])
+
+    def square_counts(self, square_idx: int):
+        first = square_idx * self.cells_per_square
+        return self.counts[first : first + self.cells_per_square]
+
+    def value_cells(self):
+        # cell index of every value
+        return np.repeat(np.arange(len(self.counts)), self.counts)
+
+    def volume_indices(self):
+        # index of every value within its cell, 0 for the lowest volume
+        return np.arange(self.size, dtype=np.int64) - np.repeat(
+            self.offsets[:-1], self.counts
+        )
+
+    def sort(self):
+        # z and wrapped values ascending within each cell, each on its own
+        cells = self.value_cells()
+        for name in ("z", "w"):
+            values = getattr(self, name)[: self.size]
+            values[:] = values[np.lexsort((values, cells))]
+
+    def gather(self, order):
+        # counts and value indices of the cells in the given order
+        counts = self.counts[order]
+        starts = self.offsets[order]
+        first = np.cumsum(counts, dtype=np.int64) - counts
+        values = np.arange(int(counts.sum()), dtype=np.int64) + np.repeat(
+            starts - first, counts
+        )
+        return counts, values
+
+
+def square_candidates(bounds, x0: float, y0: float, square_size: float, num_squares: int):
+    # objects whose world XY bounds overlap each square (sx * num_squares + sy);
+    # bounds: (min_x, min_y, max_x, max_y), squares start at (x0, y0)
+    squares = [[] for _ in range(num_squares * num_squares)]
+    for i, (min_x, min_y, max_x, max_y) in enumerate(bounds):
+        sx0 = max(int(np.floor((min_x - x0) / square_size)), 0)
+        sx1 = min(int(np.floor((max_x - x0) / square_size)), num_squares - 1)
+        sy0 = max(int(np.floor((min_y - y0) / square_size)), 0)
+        sy1 = min(int(np.floor((max_y - y0) / square_size)), num_squares - 1)
+        for sx in range(sx0, sx1 + 1):
+            for sy in range(sy0, sy1 + 1):
+                squares[sx * num_squares + sy].append(i)
+    return squares
+
+
+def merge_column_hits(hit_zs):
+    # hit_zs: first hit of each object, highest first
+    volumes = []
+    wrapped = []
+    for z in hit_zs:
+        wrap = 0
+        if z < 0:
+            wrap = z
+            z = MAX_Z + z
+
+        if len(volumes) == 0 or volumes[len(volumes) - 1] - z > 1:
+            volumes.append(z)
+            wrapped.append(wrap)
+
+    return volumes, wrapped
+
+
+def column_volumes(hits, max_height: float):
+    # hits: every hit along the column as (z, object), highest first
+    # returns the sorted volumes and wrapped values, like merge_column_hits on
+    # the first hit of each object below max_height
+    seen = set()
+    top_zs = []
+    for z, obj in hits:
+        if z <= max_height and obj not in seen:
+            seen.add(obj)
+            top_zs.append(z)
+
+    volumes, wrapped = merge_column_hits(top_zs)
+    volumes.sort()
+    wrapped.sort()
+    return volumes, wrapped
+
+
+def z_tolerance(z: float, tolerance: float):
+    # hit and origin z go through float32 (mathutils.Vector), whose spacing grows
+    # with the magnitude: keep tolerances at least 2 float32 steps wide, and
+    # under the 0.001 ceiling cast offset for every z a zone can hold
+    return max(tolerance, abs(z) * 2**-22)
+
+
+def column_ceiling(column, z: float):
+    # column: every hit z along the column, lowest first
+    # returns (ambiguous, found_z) for a cast up from z + 0.001; ambiguous when a
+    # hit lies too close to the cast origin to tell which side of it it is on
+    start = z + 0.001
+    tolerance = z_tolerance(start, CEILING_TOLERANCE)
+    above = bisect.bisect_left(column, start - tolerance)
+    if above == len(column):
+        return False, None
+    if column[above] < start + tolerance:
+        return True, None
+    return False, column[above]
+
+
+def cell_height(z: float, found_z):
+    # found_z: ceiling hit above z, None when the upward cast missed
+    if found_z is not None:
+        h = found_z - abs(z)
+    else:
+        h = MAX_Z / 2
+
+    if h < 0:
+        h += MAX_Z / 2
+
+    if h > MAX_Z / 2:
+        h = MAX_Z / 2
+
+    return h
+
+
+def export_geo(output_path: str, pos, export_order, cells: CellVolumes):
+    start = time.time()
+
+    volumes_per_cell, values = cells.gather(export_order)
+    z_values = cells.z[values]
+    h_values = cells.h[values]
+
+    z_encoded, z_overflow = encode_geo_values(z_values)
+    h_encoded, h_overflow = encode_geo_values(h_values)
+
+    if z_overflow.any() or h_overflow.any():
+        value_cells = np.repeat(export_order, volumes_per_cell)
+        for i in np.flatnonzero(z_overflow):
+            P.print(f"{value_cells[i]} ERROR on Z:{z_values[i]}")
+        for i in np.flatnonzero(h_overflow):
+            P.print(f"{value_cells[i]} ERROR on H:{h_values[i]}")
+
+    write_zone(
+        f"{output_path}/x{pos.x}y{pos.y}.idx",
+        f"{output_path}/x{pos.x}y{pos.y}.geo",
+        volumes_per_cell,
+        z_encoded,
+        h_encoded,
+    )
+
+    P.print(
+        f"EXPORT > Zone ({pos.x}:{pos.y}) | {len(z_values)} volumes | {time.time() - start:.2f} s"
+    )
@@ -0,0 +1,131 @@
+import os
+import struct
+import numpy as np
+
+CHECKPOINT_MAGIC = b"TGCP"
+CHECKPOINT_VERSION = 3  # 3: float64 values
+
+PHASE_Z = 0  # volumes + wrapped
+PHASE_H = 1  # heights
+
+PHASE_COLUMNS = {PHASE_Z: 2, PHASE_H: 1}
+
+RECORD_HEADER = struct.Struct("<BII")  # phase, square index, value count
+
+
+class GeoCheckpoint:
+    # append-only log of completed squares, flushed every `every` squares
+    def __init__(self, path: str, stamp: str, cells_per_square: int, every: int = 64):
+        self.path = path
+        self.stamp = stamp.encode()
+        self.cells_per_square = cells_per_square
+        self.every = every
+
+        self.__file = None
+        self.__pending = []
+        self.__restored = {PHASE_Z: {}, PHASE_H: {}}  # phase : square : counts, values
+        self.done = {PHASE_Z: set(), PHASE_H: set()}
+        self.resumed = False  # whether open picked up an existing checkpoint
+
+    def open(self, resume: bool):
+        if resume and os.path.exists(self.path):
+            valid_size = self.__load()
+            if valid_size is not None:
+                self.resumed = True
+                self.__file = open(self.path, "r+b")
+                # drop a record cut short by a crash
+                self.__file.truncate(valid_size)
+                self.__file.seek(valid_size)
+                return
+
+        self.__restored = {PHASE_Z: {}, PHASE_H: {}}
+        self.done = {PHASE_Z: set(), PHASE_H: set()}
+        self.__file = open(self.path, "wb")
+        self.__file.write(CHECKPOINT_MAGIC)
+        self.__file.write(struct.pack("<II", CHECKPOINT_VERSION, len(self.stamp)))
+        self.__file.write(self.stamp)
+        self.__file.flush()
+
+    def __load(self):
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        header_size = len(CHECKPOINT_MAGIC) + 8
+        if data[: len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC:
+            return None
+        version, stamp_size = struct.unpack_from("<II", data, len(CHECKPOINT_MAGIC))
+        stamp = data[header_size : header_size + stamp_size]
+        if version != CHECKPOINT_VERSION or stamp != self.stamp:
+            return None
+
+        offset = header_size + stamp_size
+        counts_size = self.cells_per_square * 2
+        while offset + RECORD_HEADER.size <= len(data):
+            phase, square_idx, value_count = RECORD_HEADER.unpack_from(data, offset)
+            if phase not in self.__restored:
+                break
+            columns = PHASE_COLUMNS[phase]
+            end = offset + RECORD_HEADER.size + counts_size + value_count * 8 * columns
+            if end > len(data):
+                break
+
+            start = offset + RECORD_HEADER.size
+            counts = np.frombuffer(data, "<u2", self.cells_per_square, start)
+            values = np.frombuffer(
+                data, "<f8", value_count * columns, start + counts_size
+            ).reshape(columns, value_count)
+
+            self.__restored[phase][square_idx] = (counts, values)
+            self.done[phase].add(square_idx)
+            offset = end
+
+        return offset
+
+    def is_done(self, phase: int, square_idx: int):
+        return square_idx in self.done[phase]
+
+    def restore_square(self, phase: int, square_idx: int, cells):
+        # Z: appends the recorded volumes to a CellVolumes, H: fills in the heights
+        # of its (already sorted) volumes
+        counts, values = self.__restored[phase].pop(square_idx)
+        if phase == PHASE_Z:
+            cells.append_range(
+                square_idx * self.cells_per_square, counts, values[0], values[1]
+            )
+        else:
+            start, end = cells.square_range(square_idx)
+            cells.h[start:end] = values[0]
+
+    def add_square(self, phase: int, square_idx: int, cells):
+        # Z: the square must be the last one appended to cells
+        counts = cells.square_counts(square_idx)
+        value_count = int(counts.sum())
+        if phase == PHASE_Z:
+            end = cells.size
+            start = end - value_count
+            columns = (cells.z[start:end], cells.w[start:end])
+        else:
+            start, end = cells.square_range(square_idx)
+            columns = (cells.h[start:end],)
+
+        self.__pending.append(RECORD_HEADER.pack(phase, square_idx, value_count))
+        self.__pending.append(counts.astype("<u2").tobytes())
+        for column in columns:
+            self.__pending.append(column.astype("<f8").tobytes())
+        self.done[phase].add(square_idx)
+
+        if len(self.done[phase]) % self.every == 0:
+            self.flush()
+
+    def flush(self):
+        if len(self.__pending) != 0:
+            self.__file.write(b"".join(self.__pending))
+            self.__file.flush()
+            self.__pending = []
+
+    def close(self):
+        if self.__file is None:
+            return
+        self.flush()
+        self.__file.close()
+        self.__file = None
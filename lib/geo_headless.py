@@ -0,0 +1,259 @@
+import bisect
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+
+from lib.topology import Point2D
+from lib.printer import Printer
+from lib.time_tracker import TimeTracker
+from lib.utils import Utils
+from lib.geo_cells import (
+    CellGrid,
+    CellVolumes,
+    merge_column_hits,
+    cell_height,
+    export_geo,
+)
+from lib.tri_engine import TriangleSoup, TriangleEngine
+import lib.globals
+
+P = Printer()
+T = TimeTracker()
+
+MAX_Z = lib.globals.MAX_Z
+
+
+class HeadlessGeoGenerator:
+    # GeoGenerator without Blender: casts against a TriangleSoup exported by
+    # GeoGenerator.export_triangles, one row of squares per batch
+    def __init__(self, soup: TriangleSoup, pos: Point2D = None, origin: Point2D = None):
+        self.num_squares: int = lib.globals.NUM_SQUARES
+        self.num_cells: int = lib.globals.NUM_CELLS
+
+        self.pos = pos if pos is not None else soup.position
+        self.origin = origin if origin is not None else soup.origin
+        self.scene_scale = soup.scene_scale
+        self.max_height = (65535 / 2) / self.scene_scale
+
+        self.rel_pos = Point2D(self.pos.x - self.origin.x, self.pos.y - self.origin.y)
+        self.size = lib.globals.BASE_ZONE_SIZE * self.scene_scale
+
+        self.soup = soup
+        self.grid = CellGrid(
+            self.rel_pos, self.size, self.num_squares, self.num_cells, self.scene_scale
+        )
+        self.engine = TriangleEngine(soup)
+
+    def generate_row(self, sx: int):
+        # volume counts, then flat volumes, wrapped and heights of every cell in
+        # the squares (sx, 0..n), in cell order
+        cells = self.grid.row_cells(sx)
+        counts, z, object_ids = self.engine.cast_columns(
+            self.grid.x[cells], self.grid.y[cells]
+        )
+        ray_ids = np.repeat(np.arange(len(counts)), counts)
+
+        # first hit of every object below the cast origin, highest first
+        below = np.flatnonzero(z <= self.max_height)
+        keys = ray_ids[below] * (len(self.soup.object_names) + 1) + object_ids[below]
+        first = np.sort(below[np.unique(keys, return_index=True)[1]])
+        top_counts = np.bincount(ray_ids[first], minlength=len(counts))
+
+        all_z = z.tolist()
+        top_z = z[first].tolist()
+        all_end = np.cumsum(counts).tolist()
+        top_end = np.cumsum(top_counts).tolist()
+
+        volume_counts = np.zeros(len(counts), dtype=np.uint16)
+        volumes = []
+        wrapped = []
+        heights = []
+        missed = 0
+        for i in range(len(counts)):
+            if top_counts[i] == 0:
+                missed += 1
+                continue
+
+            z_values, w_values = merge_column_hits(
+                top_z[top_end[i] - top_counts[i] : top_end[i]]
+            )
+            z_values.sort()
+            w_values.sort()
+            volume_counts[i] = len(z_values)
+            volumes += z_values
+            wrapped += w_values
+
+            # every hit along the column, lowest first, for the upward casts
+            column = all_z[all_end[i] - counts[i] : all_end[i]]
+            column.reverse()
+
+            for v in range(len(z_values)):
+                z_cast = z_values[v]
+                if w_values[v] != 0:
+                    z_cast -= MAX_Z
+
+                above = bisect.bisect_left(column, z_cast + 0.001)
+                found_z = column[above] if above < len(column) else None
+                heights.append(cell_height(z_cast, found_z))
+
+        return volume_counts, volumes, wrapped, heights, missed
+
+    def generate(self, workers: int = 1):
+        if workers > 1:
+            self.generate_parallel(workers)
+            return
+
+        T.start()
+
+        self.cells = self.__create_cells()
+
+        missed = 0
+        for sx in range(self.num_squares):
+            counts, volumes, wrapped, heights, row_missed = self.generate_row(sx)
+            self.cells.append_range(
+                self.grid.row_cells(sx).start, counts, volumes, wrapped, heights
+            )
+            missed += row_missed
+
+            squares_per_sec = T.get_iterations_per_sec() * self.num_squares
+            squares_left = (self.num_squares - sx - 1) * self.num_squares
+            time_left = squares_left / squares_per_sec
+            P.reprint(
+                f'RAYCAST > Zone ({self.pos.x}:{self.pos.y}) | Row {str(int(sx)).rjust(3, " ")} | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
+            )
+
+        self.cells.trim()
+        if missed != 0:
+            P.print(f"Missed {missed} cells in zone ({self.pos.x}:{self.pos.y})")
+
+    def __create_cells(self):
+        return CellVolumes(len(self.grid), self.num_cells * self.num_cells)
+
+    def generate_parallel(self, workers: int, shards: int = None):
+        # contiguous ranges of square rows, merged back in row order
+        if shards is None:
+            shards = workers
+        rows = list(range(self.num_squares))
+        shard_rows = [
+            rows[len(rows) * i // shards : len(rows) * (i + 1) // shards]
+            for i in range(shards)
+        ]
+
+        self.cells = self.__create_cells()
+
+        start = time.time()
+        missed = 0
+        with multiprocessing.Manager() as manager:
+            progress = manager.Queue()
+            done = [0] * shards
+
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(self.soup, self.pos, self.origin),
+            ) as executor:
+                futures = [
+                    executor.submit(generate_shard, i, shard_rows[i], progress)
+                    for i in range(shards)
+                ]
+
+                pending = set(futures)
+                while len(pending) != 0:
+                    pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)[1]
+                    while not progress.empty():
+                        shard_idx, sx = progress.get()
+                        done[shard_idx] += 1
+
+                    rows_done = sum(done)
+                    squares_per_sec = (
+                        rows_done * self.num_squares / max(time.time() - start, 0.001)
+                    )
+                    squares_left = (self.num_squares - rows_done) * self.num_squares
+                    time_left = squares_left / max(squares_per_sec, 0.001)
+                    shard_status = " ".join(
+                        f"{done[i]}/{len(shard_rows[i])}" for i in range(shards)
+                    )
+                    P.reprint(
+                        f"RAYCAST > Zone ({self.pos.x}:{self.pos.y}) | Shards {shard_status} | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}"
+                    )
+
+                for i, future in enumerate(futures):
+                    counts, volumes, wrapped, heights, shard_missed = future.result()
+                    if len(shard_rows[i]) != 0:
+                        self.cells.append_range(
+                            self.grid.row_cells(shard_rows[i][0]).start,
+                            counts,
+                            volumes,
+                            wrapped,
+                            heights,
+                        )
+                    missed += shard_missed
+
+        self.cells.trim()
+
+        P.print(
+            f"RAYCAST > Zone ({self.pos.x}:{self.pos.y}) | {shards} shards on {workers} workers done in {Utils.time_convert(time.time() - start)}"
+        )
+        if missed != 0:
+            P.print(f"Missed {missed} cells in zone ({self.pos.x}:{self.pos.y})")
+
+    def export(self, output_path: str):
+        export_geo(output_path, self.pos, self.grid.export_order, self.cells)
+
+
+# per-process generator of the worker pool
+worker_generator = None
+
+
+def init_worker(soup: TriangleSoup, pos: Point2D, origin: Point2D):
+    global worker_generator
+    worker_generator = HeadlessGeoGenerator(soup, pos, origin)
+
+
+def generate_shard(shard_idx: int, rows: list, progress):
+    # rows are contiguous: the shard's cells follow each other in cell order
+    counts = []
+    volumes = []
+    wrapped = []
+    heights = []
+    missed = 0
+    for sx in rows:
+        row_counts, row_volumes, row_wrapped, row_heights, row_missed = (
+            worker_generator.generate_row(sx)
+        )
+        counts.append(row_counts)
+        volumes += row_volumes
+        wrapped += row_wrapped
+        heights += row_heights
+        missed += row_missed
+        progress.put((shard_idx, sx))
+
+    if len(counts) == 0:
+        return np.zeros(0, dtype=np.uint16), [], [], [], missed
+    return (
+        np.concatenate(counts),
+        np.array(volumes, dtype=np.float64),
+        np.array(wrapped, dtype=np.float64),
+        np.array(heights, dtype=np.float64),
+        missed,
+    )
+
+
+def generate_geo_headless(
+    soup_path: str, export_path: str = None, workers: int = 1, cells_path: str = None
+):
+    # cells_path: also save the generated CellVolumes, see GeoGenerator.generate_parallel
+    start = time.time()
+    generator = HeadlessGeoGenerator(TriangleSoup.load(soup_path))
+    generator.generate(workers)
+    if cells_path is not None:
+        generator.cells.save(cells_path)
+    if export_path is not None:
+        generator.export(export_path)
+
+    end = time.time()
+
+    P.print(
+        f"{soup_path} @ x{generator.pos.x}y{generator.pos.y} done in: {Utils.time_convert(end - start)} | using {generator.num_cells}x{generator.num_cells} cells, {generator.num_squares}x{generator.num_squares} squares"
+    )
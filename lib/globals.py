@@ -4,3 +4,5 @@ ZONE_SIZE = 15360
 BASE_ZONE_SIZE = ZONE_SIZE / magic_number_i_didnt_figure_out_yet
 NUM_CELLS = 8
 NUM_SQUARES = 120
+
+MAX_Z = 65535 / 25
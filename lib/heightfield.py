@@ -0,0 +1,152 @@
+import numpy as np
+
+# custom properties MapImporter puts on terrain objects, see HeightField.from_object
+HEIGHTMAP_PROP = "tera_heightmap"
+SUBDIVISIONS_PROP = "tera_subdivisions"
+STRENGTH_PROP = "tera_strength"
+MID_LEVEL_PROP = "tera_mid_level"
+
+HEIGHTMAP_UV = "HeightUV"
+
+
+def is_heightfield(obj):
+    return HEIGHTMAP_PROP in obj
+
+
+class HeightField:
+    # a terrain quad displaced by its heightmap, sampled without building the
+    # SUBSURF + DISPLACE mesh: vertex heights on the subdivision grid, bilinear
+    # in between, mapped to world space with the object's transform
+    def __init__(self, values, uv_from_xy, z_from_uv, z_per_value):
+        self.values = values  # (n + 1, n + 1) texture value per grid vertex, [v, u]
+        self.uv_from_xy = uv_from_xy  # (2, 3) affine world xy -> uv
+        self.z_from_uv = z_from_uv  # (3,) affine uv -> world z of the flat quad
+        self.z_per_value = z_per_value  # world z offset per unit of texture value
+
+    def from_image(
+        pixels,
+        uv_to_local,
+        normal,
+        matrix_world,
+        subdivisions: int = 512,
+        strength: float = 1310.5,
+        mid_level: float = 0.5,
+    ):
+        # pixels: (h, w, channels) bottom row first, like bpy image pixels
+        # uv_to_local: (3, 3) affine uv -> quad local position, normal: local face normal
+        pixels = np.asarray(pixels, dtype=np.float64)
+        intensity = pixels[:, :, :3].mean(axis=2) if pixels.ndim == 3 else pixels
+        h, w = intensity.shape
+
+        # the displace texture is sampled once per subdivided vertex, nearest pixel
+        # with extended edges (use_interpolation off, EXTEND)
+        t = np.arange(subdivisions + 1) / subdivisions
+        px = np.clip(np.floor(t * w).astype(np.int64), 0, w - 1)
+        py = np.clip(np.floor(t * h).astype(np.int64), 0, h - 1)
+        values = intensity[py[:, None], px[None, :]]
+
+        matrix = np.asarray(matrix_world, dtype=np.float64)
+        uv_to_world = matrix[:3, :3] @ np.asarray(uv_to_local, dtype=np.float64)
+        uv_to_world[:, 2] += matrix[:3, 3]
+        world_normal = matrix[:3, :3] @ np.asarray(normal, dtype=np.float64)
+
+        # displacement: local co += normal * (value - mid_level) * strength; only
+        # its z component is kept, the terrain transform keeps the normal vertical
+        z_from_uv = uv_to_world[2].copy()
+        z_from_uv[2] -= world_normal[2] * mid_level * strength
+        xy_from_uv = np.vstack([uv_to_world[:2], [0, 0, 1]])
+
+        return HeightField(
+            values,
+            np.linalg.inv(xy_from_uv)[:2],
+            z_from_uv,
+            world_normal[2] * strength,
+        )
+
+    def from_object(obj):
+        # terrain quad created by MapImporter, with its heightmap custom properties
+        import bpy
+
+        image = bpy.data.images.load(obj[HEIGHTMAP_PROP], check_existing=True)
+        image.colorspace_settings.name = "Non-Color"
+        w, h = image.size
+        pixels = np.empty(w * h * image.channels, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+
+        mesh = obj.data
+        uv_layer = mesh.uv_layers[HEIGHTMAP_UV]
+        loops = mesh.polygons[0].loop_indices[:3]
+        uv = np.array([[*uv_layer.data[i].uv, 1] for i in loops])
+        co = np.array([mesh.vertices[mesh.loops[i].vertex_index].co[:] for i in loops])
+
+        return HeightField.from_image(
+            pixels.reshape(h, w, image.channels),
+            np.linalg.solve(uv, co).T,
+            mesh.polygons[0].normal[:],
+            obj.matrix_world,
+            obj.get(SUBDIVISIONS_PROP, 512),
+            obj.get(STRENGTH_PROP, 1310.5),
+            obj.get(MID_LEVEL_PROP, 0.5),
+        )
+
+    def bounds(self):
+        # world XY bounds (min_x, min_y, max_x, max_y)
+        xy_from_uv = np.linalg.inv(np.vstack([self.uv_from_xy, [0, 0, 1]]))[:2]
+        corners = xy_from_uv @ np.array([[0, 1, 1, 0], [0, 0, 1, 1], [1, 1, 1, 1]])
+        return (*corners.min(axis=1).tolist(), *corners.max(axis=1).tolist())
+
+    def top(self):
+        # highest world z the terrain can reach
+        return float(
+            self.z_from_uv[2]
+            + max(self.z_from_uv[0], 0)
+            + max(self.z_from_uv[1], 0)
+            + max(self.z_per_value * self.values.min(), self.z_per_value * self.values.max())
+        )
+
+    def fingerprint_bytes(self):
+        return b"".join(
+            np.ascontiguousarray(a, dtype=np.float64).tobytes()
+            for a in (self.values, self.uv_from_xy, self.z_from_uv, [self.z_per_value])
+        )
+
+    def sample(self, xs, ys):
+        # world z of the terrain above/below every (x, y), and whether it covers it
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        u = self.uv_from_xy[0, 0] * xs + self.uv_from_xy[0, 1] * ys + self.uv_from_xy[0, 2]
+        v = self.uv_from_xy[1, 0] * xs + self.uv_from_xy[1, 1] * ys + self.uv_from_xy[1, 2]
+        inside = (u >= 0) & (u <= 1) & (v >= 0) & (v <= 1)
+
+        n = len(self.values) - 1
+        gu = np.clip(u, 0, 1) * n
+        gv = np.clip(v, 0, 1) * n
+        iu = np.minimum(np.floor(gu).astype(np.int64), n - 1)
+        iv = np.minimum(np.floor(gv).astype(np.int64), n - 1)
+        fu = gu - iu
+        fv = gv - iv
+
+        value = (
+            self.values[iv, iu] * (1 - fu) * (1 - fv)
+            + self.values[iv, iu + 1] * fu * (1 - fv)
+            + self.values[iv + 1, iu] * (1 - fu) * fv
+            + self.values[iv + 1, iu + 1] * fu * fv
+        )
+        z = self.z_from_uv[0] * u + self.z_from_uv[1] * v + self.z_from_uv[2]
+        return z + self.z_per_value * value, inside
+
+    def save_arrays(self, prefix: str):
+        return {
+            f"{prefix}values": self.values.astype(np.float32),
+            f"{prefix}uv_from_xy": self.uv_from_xy,
+            f"{prefix}z_from_uv": self.z_from_uv,
+            f"{prefix}z_per_value": np.array(self.z_per_value),
+        }
+
+    def load_arrays(data, prefix: str):
+        return HeightField(
+            data[f"{prefix}values"].astype(np.float64),
+            data[f"{prefix}uv_from_xy"],
+            data[f"{prefix}z_from_uv"],
+            float(data[f"{prefix}z_per_value"]),
+        )
@@ -0,0 +1,297 @@
+import hashlib
+import os
+import zipfile
+import numpy as np
+from mathutils import Vector
+
+from lib.map import (
+    Level,
+    Terrain,
+    StaticMeshActor,
+    StaticMeshComponent,
+    SceneComponent,
+    ConvexElem,
+)
+from lib.printer import Printer
+
+P = Printer()
+
+LEVEL_CACHE_VERSION = 2  # 2: mesh paths use the platform separator
+
+TERRAIN_VECTORS = ("rel_location", "rel_scale", "abs_location", "abs_scale")
+
+
+def get_source_stats(paths):
+    # (size, mtime_ns) of every source file, (-1, -1) when missing
+    stats = np.full((len(paths), 2), -1, dtype=np.int64)
+    for i, path in enumerate(paths):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stats[i] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def hash_files(paths):
+    h = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        h.update(path.encode())
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+    return h.hexdigest()
+
+
+def get_level_sources(t3d_path: str, terrains_path: str, terrains):
+    # every file Level.read_from and Terrain.read_from read
+    base_path = os.path.dirname(terrains_path)
+    return [t3d_path, terrains_path] + [
+        terrain.get_setup_path(base_path) for terrain in terrains
+    ]
+
+
+def pack_vectors(vectors):
+    return np.array([tuple(v) for v in vectors], dtype=np.float64).reshape(-1, 3)
+
+
+def pack_strings(strings):
+    return np.array(list(strings), dtype=np.str_)
+
+
+def pack_level(level: Level):
+    actors = level.actors
+    smcs = [sma.smc for sma in actors]
+    scene_components = [sma.scene_component for sma in actors]
+    convex_elems = [elem for smc in smcs for elem in smc.agg_geoms]
+
+    return {
+        "level_name": np.array(level.name),
+        "actor_names": pack_strings(sma.name for sma in actors),
+        "actor_indices": np.array([sma.index for sma in actors], dtype=np.int64),
+        "actor_labels": pack_strings(sma.label for sma in actors),
+        "layer_counts": np.array([len(sma.layers) for sma in actors], dtype=np.int64),
+        "layers": pack_strings(layer for sma in actors for layer in sma.layers),
+        "smc_names": pack_strings(smc.name for smc in smcs),
+        "mesh_paths": pack_strings(smc.mesh_path for smc in smcs),
+        "smc_locations": pack_vectors(smc.location for smc in smcs),
+        "smc_rotations": pack_vectors(smc.rotation for smc in smcs),
+        "smc_scales": pack_vectors(smc.scale for smc in smcs),
+        "disable_collisions": np.array(
+            [smc.disable_collisions for smc in smcs], dtype=bool
+        ),
+        "has_scene_component": np.array(
+            [sc is not None for sc in scene_components], dtype=bool
+        ),
+        "sc_names": pack_strings(sc.name for sc in scene_components if sc is not None),
+        "sc_locations": pack_vectors(
+            sc.location for sc in scene_components if sc is not None
+        ),
+        "sc_rotations": pack_vectors(
+            sc.rotation for sc in scene_components if sc is not None
+        ),
+        "sc_scales": pack_vectors(sc.scale for sc in scene_components if sc is not None),
+        # AggGeom ConvexElems of every actor, flattened
+        "elem_counts": np.array([len(smc.agg_geoms) for smc in smcs], dtype=np.int64),
+        "vertex_counts": np.array(
+            [len(elem.vertices) for elem in convex_elems], dtype=np.int64
+        ),
+        "index_counts": np.array(
+            [len(elem.indices) for elem in convex_elems], dtype=np.int64
+        ),
+        "vertices": np.concatenate(
+            [np.zeros((0, 3))] + [elem.vertices for elem in convex_elems]
+        ),
+        "indices": np.concatenate(
+            [np.zeros(0, dtype=np.int32)] + [elem.indices for elem in convex_elems]
+        ).astype(np.int32),
+    }
+
+
+def unpack_level(data):
+    level = Level(str(data["level_name"]))
+
+    layer_counts = data["layer_counts"].tolist()
+    layer_ends = np.cumsum(layer_counts).tolist()
+    elem_counts = data["elem_counts"].tolist()
+    elem_ends = np.cumsum(elem_counts).tolist()
+    vertex_counts = data["vertex_counts"].tolist()
+    vertex_ends = np.cumsum(vertex_counts).tolist()
+    index_counts = data["index_counts"].tolist()
+    index_ends = np.cumsum(index_counts).tolist()
+    layers = data["layers"].tolist()
+    vertices = data["vertices"]
+    indices = data["indices"]
+
+    scene_components = iter(
+        zip(
+            data["sc_names"].tolist(),
+            data["sc_locations"].tolist(),
+            data["sc_rotations"].tolist(),
+            data["sc_scales"].tolist(),
+        )
+    )
+
+    actors = zip(
+        data["actor_names"].tolist(),
+        data["actor_indices"].tolist(),
+        data["actor_labels"].tolist(),
+        data["smc_names"].tolist(),
+        data["mesh_paths"].tolist(),
+        data["smc_locations"].tolist(),
+        data["smc_rotations"].tolist(),
+        data["smc_scales"].tolist(),
+        data["disable_collisions"].tolist(),
+        data["has_scene_component"].tolist(),
+    )
+    for i, (
+        name,
+        idx,
+        label,
+        smc_name,
+        mesh_path,
+        location,
+        rotation,
+        scale,
+        disable_collisions,
+        has_scene_component,
+    ) in enumerate(actors):
+        sma = StaticMeshActor(name, idx)
+        sma.label = label
+        sma.layers = layers[layer_ends[i] - layer_counts[i] : layer_ends[i]]
+
+        smc = StaticMeshComponent(smc_name)
+        smc.mesh_path = mesh_path
+        smc.location = Vector(location)
+        smc.rotation = Vector(rotation)
+        smc.scale = Vector(scale)
+        smc.disable_collisions = disable_collisions
+
+        for e in range(elem_ends[i] - elem_counts[i], elem_ends[i]):
+            smc.agg_geoms.append(
+                ConvexElem(
+                    vertices[vertex_ends[e] - vertex_counts[e] : vertex_ends[e]],
+                    indices[index_ends[e] - index_counts[e] : index_ends[e]],
+                )
+            )
+        sma.smc = smc
+
+        if has_scene_component:
+            sc_name, sc_location, sc_rotation, sc_scale = next(scene_components)
+            sc = SceneComponent(sc_name)
+            sc.location = Vector(sc_location)
+            sc.rotation = Vector(sc_rotation)
+            sc.scale = Vector(sc_scale)
+            sma.scene_component = sc
+
+        level.actors.append(sma)
+
+    return level
+
+
+def pack_terrains(terrains):
+    ret = {
+        "terrain_maps": pack_strings(terrain.map for terrain in terrains),
+        "terrain_names": pack_strings(terrain.name for terrain in terrains),
+    }
+    # vectors a terrain never read are stored as nan
+    for name in TERRAIN_VECTORS:
+        ret[f"terrain_{name}s"] = np.array(
+            [tuple(getattr(terrain, name, (np.nan,) * 3)) for terrain in terrains],
+            dtype=np.float64,
+        ).reshape(-1, 3)
+    return ret
+
+
+def unpack_terrains(data):
+    ret = []
+    for i, (map_name, name) in enumerate(
+        zip(data["terrain_maps"].tolist(), data["terrain_names"].tolist())
+    ):
+        terrain = Terrain("")
+        terrain.map = map_name
+        terrain.name = name
+        for vector_name in TERRAIN_VECTORS:
+            vector = data[f"terrain_{vector_name}s"][i]
+            if not np.isnan(vector).any():
+                setattr(terrain, vector_name, Vector(vector))
+        ret.append(terrain)
+    return ret
+
+
+class LevelCache:
+    # parsed Level and Terrains of a map, valid while the .t3d, Terrains.txt and
+    # Setup.txt files keep their size and either their mtime or their content hash
+    def save(path: str, t3d_path: str, terrains_path: str, level: Level, terrains):
+        sources = get_level_sources(t3d_path, terrains_path, terrains)
+        # written next to the cache and moved over it, so an interrupted save
+        # leaves the previous cache (or none) rather than a truncated one
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    version=np.array(LEVEL_CACHE_VERSION),
+                    sources=pack_strings(sources),
+                    source_stats=get_source_stats(sources),
+                    source_hash=np.array(hash_files(sources)),
+                    **pack_level(level),
+                    **pack_terrains(terrains),
+                )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def try_save(path: str, t3d_path: str, terrains_path: str, level: Level, terrains):
+        # the cache is optional: a read-only or full disk only costs the next parse
+        try:
+            LevelCache.save(path, t3d_path, terrains_path, level, terrains)
+        except OSError as e:
+            P.print(f"Cannot write level cache {path}: {e}")
+
+    def load(path: str, t3d_path: str, terrains_path: str):
+        # (level, terrains), None when missing or out of date
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as npz:
+                # NpzFile reads an array from the archive on every access
+                data = {name: npz[name] for name in npz.files}
+                if int(data["version"]) != LEVEL_CACHE_VERSION:
+                    return None
+                sources = data["sources"].tolist()
+                if sources[:2] != [t3d_path, terrains_path]:
+                    return None
+
+                stats = get_source_stats(sources)
+                if (stats[:, 0] != data["source_stats"][:, 0]).any():
+                    return None
+                touched = (stats[:, 1] != data["source_stats"][:, 1]).any()
+                if touched and hash_files(sources) != str(data["source_hash"]):
+                    return None
+
+                level = unpack_level(data)
+                terrains = unpack_terrains(data)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # unreadable (e.g. truncated) cache: parse again
+            return None
+
+        if touched:
+            # same content under new mtimes: skip the hash next time
+            LevelCache.try_save(path, t3d_path, terrains_path, level, terrains)
+        return level, terrains
+
+    def read(path: str, t3d_path: str, terrains_path: str):
+        # cached (level, terrains), parsing the map and caching it when out of date
+        cached = LevelCache.load(path, t3d_path, terrains_path)
+        if cached is not None:
+            level, terrains = cached
+            P.print(
+                f"Loaded level {level.name} from {path} | {len(level.actors)} actors | {len(terrains)} terrains"
+            )
+            return cached
+
+        level = Level.read_from(t3d_path)
+        terrains = Terrain.read_from(terrains_path)
+        LevelCache.try_save(path, t3d_path, terrains_path, level, terrains)
+        return level, terrains
@@ -1,6 +1,15 @@
 import bpy
 import math
+import re
+import numpy as np
 from lib.t3d_utils import T3DUtils
+from lib.t3d_utils import (
+    BEGIN_ACTOR,
+    ACTOR_LABEL,
+    BEGIN_OBJECT,
+    END_OBJECT,
+    END_ACTOR,
+)
 from lib.printer import Printer
 
 import os
@@ -9,6 +18,13 @@ from mathutils import Vector
 
 P = Printer()
 
+# any property the component read_line methods look for; lines without one are
+# skipped with a single scan
+SCENE_COMPONENT_PATTERN = re.compile("RelativeLocation|RelativeRotation|RelativeScale3D")
+STATIC_MESH_COMPONENT_PATTERN = re.compile(
+    "RelativeLocation|RelativeRotation|RelativeScale3D|StaticMesh=StaticMesh|CollisionEnabled=NoCollision|AggGeom"
+)
+
 
 class StaticMeshActor:
     def __init__(self, name, idx):
@@ -31,6 +47,8 @@ class SceneComponent:
         self.location = Vector((0,0,0))
 
     def read_line(self, line):
+        if SCENE_COMPONENT_PATTERN.search(line) is None:
+            return
         if line.find("RelativeLocation") != -1:
             self.location = T3DUtils.parse_vector(line, "RelativeLocation")
         elif line.find("RelativeRotation") != -1:
@@ -72,6 +90,8 @@ class StaticMeshComponent:
         self.agg_geoms = []
 
     def read_line(self, line):
+        if STATIC_MESH_COMPONENT_PATTERN.search(line) is None:
+            return
         if "RelativeLocation" in line:
             self.location = T3DUtils.parse_vector(line, "RelativeLocation")
         elif "RelativeRotation" in line:
@@ -86,38 +106,9 @@ class StaticMeshComponent:
             self.parse_agg_geom(line)
 
     def parse_agg_geom(self, line):
-        line = line.replace("AggGeom=(", "")[:-1]
-        count = line.count("VertexData")
-
-        for _ in range(count):
-            convex_elem = ConvexElem()
-
-            vertex_data_start = line.find("VertexData")
-            idx_data_start = line.find("IndexData")
-
-            vertex_data = line[
-                vertex_data_start + len("VertexData=(") : idx_data_start - len("),")
-            ]
-            vertex_data = vertex_data.replace("),", ")|")
-
-            str_vertices = vertex_data.split("|")
-
-            for str_vert in str_vertices:
-                # P.print(str_vert)
-                convex_elem.vertices.append(T3DUtils.parse_vector(str_vert, ""))
-
-            idx_elem_box = line.find("ElemBox=")
-            idx_data = line[
-                idx_data_start + len("IndexData=(") : idx_elem_box - len("),")
-            ].split(",")
-            idx_data.reverse()
-            for str_idx in idx_data:
-                # P.print(str_idx)
-                convex_elem.indices.append(int(str_idx))
-
-            self.agg_geoms.append(convex_elem)
-
-            line = line[idx_elem_box + len("ElemBox=") :]
+        for vertices, indices in T3DUtils.parse_convex_elems(line):
+            # indices are kept reversed, flipping the triangles
+            self.agg_geoms.append(ConvexElem(vertices, indices[::-1].copy()))
 
     def apply_transform_to(self, obj):
         obj.scale.x = self.scale.x
@@ -159,15 +150,13 @@ class Level:
         # current_blockingvolumeactor = None
         # current_brush_component = None
 
-        actor_labels = []
-
-        lines = open(file_path, "r").readlines()
-        P.print(f"Read {len(lines)} lines")
+        actor_labels = set()
 
         idx = 0
-        for line in lines:
-            line = line.strip()
-            if line.startswith("Begin Actor"):
+        num_lines = 0
+        for statement, line in T3DUtils.read_statements(file_path):
+            num_lines += 1
+            if statement == BEGIN_ACTOR:
                 actor_name = T3DUtils.parse_name(line)
                 actor_class = T3DUtils.parse_class(line)
 
@@ -178,13 +167,13 @@ class Level:
                 # elif actor_class == 'BlockingVolume':
                 #     current_blockingvolumeactor = BlockingVolumeActor(f"{actor_name}_{idx}")
                 idx = idx + 1
-                actor_labels.append(actor_name)
+                actor_labels.add(actor_name)
                 P.reprint(f"Created Actor {actor_name}")
 
-            elif line.startswith("ActorLabel") and current_staticmeshactor is not None:
+            elif statement == ACTOR_LABEL and current_staticmeshactor is not None:
                 current_staticmeshactor.set_label(line)
 
-            elif line.startswith("Begin Object"):
+            elif statement == BEGIN_OBJECT:
                 obj_name = T3DUtils.parse_name(line)
                 if obj_name == "RootTransform":
                     current_scene_component = SceneComponent(obj_name)
@@ -193,7 +182,7 @@ class Level:
                 # elif obj_name.startswith('BrushComponent'):
                 #     current_brush_component = BrushComponent(obj_name)
 
-            elif line.startswith("End Object"):
+            elif statement == END_OBJECT:
                 if (
                     current_static_mesh_component != None
                     and current_staticmeshactor is not None
@@ -208,14 +197,14 @@ class Level:
                 # if current_brush_component != None and current_blockingvolumeactor != None:
                 #     current_blockingvolumeactor.brush_component = current_brush_component
 
-            elif line.startswith("End Actor"):
+            elif statement == END_ACTOR:
                 if (
                     current_staticmeshactor is not None
                     and current_staticmeshactor.smc != None
                     and current_staticmeshactor.label not in actor_labels
                 ):
                     ret.actors.append(current_staticmeshactor)
-                    actor_labels.append(current_staticmeshactor.label)
+                    actor_labels.add(current_staticmeshactor.label)
                     current_scene_component = None
                     current_static_mesh_component = None
                     current_staticmeshactor = None
@@ -237,14 +226,16 @@ class Level:
 
                 # if current_brush_component != None:
                 #     current_brush_component.read_line(line)
+
+        P.print(f"Read {num_lines} lines")
         return ret
 
 
 class BrushComponent:
     def __init__(self, name):
         self.name = name
-        self.vertices = []
-        self.indices = []
+        self.vertices = np.zeros((0, 3))
+        self.indices = np.zeros(0, dtype=np.int32)
         self.location = Vector([0, 0, 0])
 
     def read_line(self, line):
@@ -259,33 +250,14 @@ class BrushComponent:
         obj.location = self.location
 
     def parse_agg_geom(self, line):
-        line = line.replace("AggGeom=(", "")[:-1]
-        count = line.count("VertexData")
+        convex_elems = list(T3DUtils.parse_convex_elems(line))
 
-        if count > 1:
+        if len(convex_elems) > 1:
             raise Exception("More than one ConvexElem found!")
 
-        vertex_data_start = line.find("VertexData")
-        idx_data_start = line.find("IndexData")
-
-        vertex_data = line[
-            vertex_data_start + len("VertexData=(") : idx_data_start - len("),")
-        ]
-        vertex_data = vertex_data.replace("),", ")|")
-
-        str_vertices = vertex_data.split("|")
-
-        for str_vert in str_vertices:
-            # P.print(str_vert)
-            self.vertices.append(T3DUtils.parse_vector(str_vert, ""))
-
-        idx_data = line[
-            idx_data_start + len("IndexData=(") : line.find("ElemBox") - len("),")
-        ].split(",")
-
-        for str_idx in idx_data:
-            # P.print(str_idx)
-            self.indices.append(int(str_idx))
+        for vertices, indices in convex_elems:
+            self.vertices = vertices
+            self.indices = indices
 
 
 class BlockingVolumeActor:
@@ -295,9 +267,10 @@ class BlockingVolumeActor:
 
 
 class ConvexElem:
-    def __init__(self):
-        self.vertices = []
-        self.indices = []
+    def __init__(self, vertices=None, indices=None):
+        # vertices: (n, 3) float64, indices: int32, three per triangle
+        self.vertices = vertices if vertices is not None else np.zeros((0, 3))
+        self.indices = indices if indices is not None else np.zeros(0, dtype=np.int32)
 
 
 class Terrain:
@@ -333,10 +306,7 @@ class Terrain:
 
         base_path, h = os.path.split(file_path)
         for terrain in ret:
-            setup_path = os.path.join(
-                base_path, "Terrains", terrain.map, terrain.name, "Setup.txt"
-            )
-            setup_lines = open(setup_path, "r").readlines()
+            setup_lines = open(terrain.get_setup_path(base_path), "r").readlines()
             for line in setup_lines:
                 if line.startswith("Location"):
                     terrain.rel_location = T3DUtils.parse_vector(line, "Location")
@@ -349,3 +319,6 @@ class Terrain:
         idx = line.find("_Terrain")
         self.map = line[:idx]
         self.name = line[idx + 1 :]
+
+    def get_setup_path(self, base_path: str):
+        return os.path.join(base_path, "Terrains", self.map, self.name, "Setup.txt")
@@ -4,10 +4,17 @@ import math
 from lib.printer import Printer
 from lib.map import Level
 from lib.map import Terrain
+from lib.level_cache import LevelCache
 from lib.scene_utils import SceneUtils
-from lib.utils import Utils
 from mathutils import Vector
 from lib.globals import ZONE_SIZE
+from lib.heightfield import (
+    HEIGHTMAP_PROP,
+    SUBDIVISIONS_PROP,
+    STRENGTH_PROP,
+    MID_LEVEL_PROP,
+    HEIGHTMAP_UV,
+)
 
 P = Printer()
 
@@ -15,9 +22,11 @@ class MapImporter:
     def __init__(self, source_dir, map_name):
         self.source_dir = source_dir
         self.map_name = map_name
-        self.level_dir = f"{source_dir}\\{map_name}"
-        self.t3d_path = f"{self.level_dir}\\{map_name}.t3d"
-        self.terrains_path = f"{self.level_dir}\\Terrains.txt"
+        self.level_dir = os.path.join(source_dir, map_name)
+        self.t3d_path = os.path.join(self.level_dir, f"{map_name}.t3d")
+        self.terrains_path = os.path.join(self.level_dir, "Terrains.txt")
+        # parsed level and terrains, see LevelCache
+        self.level_cache_path = os.path.join(source_dir, f"{map_name}.levelcache.npz")
 
     def __import_blocking_volumes(self, level):
         idx = 0
@@ -25,9 +34,9 @@ class MapImporter:
             idx += 1
             vol_mesh = bpy.data.meshes.new(f"BlockingVolume_{str(idx)}")
             vol_mesh.from_pydata(
-                vol.brush_component.vertices,
+                vol.brush_component.vertices.tolist(),
                 [],
-                list(Utils.divide_chunks(vol.brush_component.indices, 3)),
+                vol.brush_component.indices.reshape(-1, 3).tolist(),
             )
             vol_obj = bpy.data.objects.new(f"BlockingVolume_{str(idx)}", vol_mesh)
             vol.brush_component.apply_transform_to(vol_obj)
@@ -89,9 +98,9 @@ class MapImporter:
             name = f"AG_{sma.label}_{str(idx)}"
             mesh = bpy.data.meshes.new(name)
             mesh.from_pydata(
-                convex_elem.vertices,
+                convex_elem.vertices.tolist(),
                 [],
-                list(Utils.divide_chunks(convex_elem.indices, 3)),
+                convex_elem.indices.reshape(-1, 3).tolist(),
             )
             obj = bpy.data.objects.new(name, mesh)
 
@@ -132,7 +141,9 @@ class MapImporter:
             P.reprint(f"Imported actor {idx + 1} of {len(level.actors)}")
             idx += 1
 
-    def __import_terrains(self, terrains: list[Terrain]):
+    def __import_terrains(self, terrains: list[Terrain], terrain_meshes = False):
+        # terrains are flat quads carrying their heightmap, which geo generation
+        # samples directly; the displaced mesh is only built for display
         for ter in terrains:
             # create square
             terrain_mesh = bpy.data.meshes.new(f"{ter.map}_{ter.name}")
@@ -145,37 +156,42 @@ class MapImporter:
             terrain_mesh.from_pydata(
                 points, [[0, 1], [1, 2], [2, 3], [3, 0]], [[1, 2, 3, 0]]
             )
-            terrain_mesh.uv_layers.new(name="HeightUV")
+            terrain_mesh.uv_layers.new(name=HEIGHTMAP_UV)
             obj = bpy.data.objects.new(terrain_mesh.name, terrain_mesh)
 
-            # add subsurf mod
-            subsurf = obj.modifiers.new("Subdivision", "SUBSURF")
-            subsurf.levels = 9  # todo: check
-            subsurf.subdivision_type = "SIMPLE"
-            # add displacement mod
-            displace = obj.modifiers.new("Displace", "DISPLACE")
-            # configure displacement mod
-            displace.strength = 1310.5  # todo: why?
-            displace.mid_level = 0.5
-
-            # create texture for displacement
-            tex = bpy.data.textures.new("HeightMap", "IMAGE")
-            displace.texture = tex
-            displace.texture_coords = "UV"
-
-            # solidify = obj.modifiers.new('Solidify', 'SOLIDIFY')
-            # solidify.thickness = 300
-
-            # load image from height map file
-            img = bpy.data.images.load(
-                os.path.join(
-                    self.level_dir, "Terrains", ter.map, ter.name, "HeightMap.png"
-                )
+            heightmap_path = os.path.join(
+                self.level_dir, "Terrains", ter.map, ter.name, "HeightMap.png"
             )
-            img.colorspace_settings.name = "Non-Color"
-            tex.image = img
-            tex.extension = "EXTEND"
-            tex.use_interpolation = False
+            obj[HEIGHTMAP_PROP] = heightmap_path
+            obj[SUBDIVISIONS_PROP] = 2 ** 9
+            obj[STRENGTH_PROP] = 1310.5  # todo: why?
+            obj[MID_LEVEL_PROP] = 0.5
+
+            if terrain_meshes:
+                # add subsurf mod
+                subsurf = obj.modifiers.new("Subdivision", "SUBSURF")
+                subsurf.levels = 9  # todo: check
+                subsurf.subdivision_type = "SIMPLE"
+                # add displacement mod
+                displace = obj.modifiers.new("Displace", "DISPLACE")
+                # configure displacement mod
+                displace.strength = obj[STRENGTH_PROP]
+                displace.mid_level = obj[MID_LEVEL_PROP]
+
+                # create texture for displacement
+                tex = bpy.data.textures.new("HeightMap", "IMAGE")
+                displace.texture = tex
+                displace.texture_coords = "UV"
+
+                # solidify = obj.modifiers.new('Solidify', 'SOLIDIFY')
+                # solidify.thickness = 300
+
+                # load image from height map file
+                img = bpy.data.images.load(heightmap_path)
+                img.colorspace_settings.name = "Non-Color"
+                tex.image = img
+                tex.extension = "EXTEND"
+                tex.use_interpolation = False
 
             # move square to raw position
             obj.location = ter.rel_location
@@ -193,9 +209,14 @@ class MapImporter:
             if obj.name in bpy.context.scene.collection.objects:
                 bpy.context.scene.collection.objects.unlink(obj)
 
-    def import_map(self, import_meshes = False, import_agg_geoms = True, import_actors = True, import_terrains = True, import_blocking_volumes = False, hide = False):
-        level = Level.read_from(self.t3d_path)
-        terrains = Terrain.read_from(self.terrains_path)
+    def import_map(self, import_meshes = False, import_agg_geoms = True, import_actors = True, import_terrains = True, import_blocking_volumes = False, hide = False, terrain_meshes = False, level_cache = True):
+        if level_cache:
+            level, terrains = LevelCache.read(
+                self.level_cache_path, self.t3d_path, self.terrains_path
+            )
+        else:
+            level = Level.read_from(self.t3d_path)
+            terrains = Terrain.read_from(self.terrains_path)
 
         self.map_coll = SceneUtils.find_or_create_collection(level.name)
         if import_actors:
@@ -205,7 +226,7 @@ class MapImporter:
             self.__import_blocking_volumes(level)
         
         if import_terrains:
-            self.__import_terrains(terrains)
+            self.__import_terrains(terrains, terrain_meshes)
 
         SceneUtils.reframe(self.map_coll)
 
@@ -1,8 +1,8 @@
-import os
+import shutil
 
 class Printer:
     def __clear_line(self):
-        w = os.get_terminal_size().columns
+        w = shutil.get_terminal_size().columns
         empty = ""
         for i in range(w):
             empty += " "
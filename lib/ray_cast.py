@@ -1,10 +1,12 @@
 import math
-import struct
 import time
 import bmesh
 import bpy
 import sys
 import os
+import subprocess
+import tempfile
+import numpy as np
 
 dir = os.path.dirname(bpy.data.filepath)
 if not dir in sys.path:
@@ -21,15 +23,35 @@ from lib.printer import Printer
 from lib.time_tracker import TimeTracker
 from lib.utils import Utils
 from lib.scene_utils import SceneUtils
+from lib.geo_cells import (
+    CellGrid,
+    CellVolumes,
+    square_candidates,
+    merge_column_hits,
+    column_volumes,
+    column_ceiling,
+    cell_height,
+    export_geo,
+)
+from lib.tri_engine import TriangleSoup
+from lib.column_cast import ColumnCaster
+from lib.geo_cache import SquareCache, square_fingerprints, hash_bytes, CACHE_VERSION
+from lib.geo_checkpoint import GeoCheckpoint, PHASE_Z, PHASE_H
 import lib.globals
 
 P = Printer()
 T = TimeTracker()
 
-MAX_Z = 65535 / 25
+MAX_Z = lib.globals.MAX_Z
 
 SCENE_SCALE = C.scene.unit_settings.scale_length
 
+# bpy-free entry point run by generate_parallel
+HEADLESS_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "generate_geo_headless.py",
+)
+
 
 class GeoGenerator:
     def __init__(self, src_collection_name: str, pos: Point2D, origin: Point2D):
@@ -46,8 +68,21 @@ class GeoGenerator:
         self.square_size = self.size / self.num_squares
 
         self.src_coll_name = src_collection_name
+        self.grid = None  # cell positions and export order, see CellGrid
+        self.__caster = None
+        self.__cache = None
+        self.__square_fingerprints = None
+        self.__square_candidates = None
+        self.cache_path = None  # per-square results of the previous run, see SquareCache
+        self.__checkpoint = None
+        self.checkpoint_path = None  # completed squares of this run, see GeoCheckpoint
+        self.checkpoint_every = 64  # squares between checkpoint writes
+        self.resume = False
 
     def setup(self):
+        self.grid = CellGrid(
+            self.rel_pos, self.size, self.num_squares, self.num_cells, SCENE_SCALE
+        )
         self.__create_bounding_box()
 
         self.__excl_coll = SceneUtils.find_or_create_collection(
@@ -110,30 +145,6 @@ class GeoGenerator:
         self.bounding_box_object = bb_obj
         self.bounding_box_bvhtree = bb_bvhtree
 
-    def __get_square_pos(self, sx: int, sy: int):
-        return Point2D(
-            (sx * self.square_size + self.rel_pos.y * self.size) / SCENE_SCALE,
-            (sy * self.square_size + self.rel_pos.x * self.size) / SCENE_SCALE,
-        )
-
-    def __get_cell_pos(self, sx: int, sy: int, cx: int, cy: int):
-        sq_pos = self.__get_square_pos(sx, sy)
-        cell_rel_pos = Point2D(
-            (cx + 0.5) * ((self.square_size / self.num_cells) / SCENE_SCALE),
-            (cy + 0.5) * ((self.square_size / self.num_cells) / SCENE_SCALE),
-        )
-
-        return Point2D(
-            round(cell_rel_pos.x + sq_pos.x, 3), round(cell_rel_pos.y + sq_pos.y, 3)
-        )
-
-    def __get_cell_index(self, sx: int, sy: int, cx: int, cy: int):
-        return int(
-            (self.num_cells * cx)
-            + cy
-            + (sx * self.num_squares + sy) * int(math.pow(self.num_cells, 2))
-        )
-
     def __is_object_partially_in_zone(self, object):
         # create bmesh objects
         bm = bmesh.new()
@@ -166,66 +177,175 @@ class GeoGenerator:
 
         return ret
 
-    def __raycast(self, x: float, y: float, z: float, z_dir: float = -1):
-        result, location, normal, index, object, matrix = C.scene.ray_cast(
-            C.view_layer.depsgraph, (x, y, z), (0, 0, z_dir)
+    def __get_caster(self):
+        if self.__caster is None:
+            self.__caster = ColumnCaster(
+                self.__src_coll.all_objects, C.evaluated_depsgraph_get()
+            )
+        return self.__caster
+
+    def __raycast(
+        self, x: float, y: float, z: float, z_dir: float = -1, candidates=None
+    ):
+        return self.__get_caster().cast(x, y, z, z_dir, candidates)
+
+    def __get_square_candidates(self, sx: int, sy: int):
+        # objects whose XY bounds overlap the square, empty for void/ocean squares
+        if self.__square_candidates is None:
+            self.__square_candidates = square_candidates(
+                self.__get_caster().bounds,
+                self.rel_pos.y * self.size / SCENE_SCALE,
+                self.rel_pos.x * self.size / SCENE_SCALE,
+                self.square_size / SCENE_SCALE,
+                self.num_squares,
+            )
+        return self.__square_candidates[sx * self.num_squares + sy]
+
+    def __load_cache(self):
+        self.__cache = None
+        if self.cache_path is None:
+            return
+
+        self.__get_square_fingerprints()
+        self.__cache = SquareCache.load(
+            self.cache_path, self.__get_cache_stamp(), self.num_cells * self.num_cells
         )
-        return result, location.z, object
+
+        if self.__cache is not None:
+            reused = sum(
+                self.__is_square_cached(sx, sy)
+                for sx in range(self.num_squares)
+                for sy in range(self.num_squares)
+            )
+            P.print(
+                f"CACHE > Zone ({self.pos.x}:{self.pos.y}) | reusing {reused}/{self.num_squares * self.num_squares} squares"
+            )
+
+    def __get_square_fingerprints(self):
+        if self.__square_fingerprints is None:
+            self.__get_square_candidates(0, 0)
+            self.__square_fingerprints = square_fingerprints(
+                self.__square_candidates, self.__get_caster().fingerprints
+            )
+        return self.__square_fingerprints
+
+    def __get_cache_stamp(self):
+        return f"{CACHE_VERSION}|{self.pos.x},{self.pos.y}|{self.origin.x},{self.origin.y}|{SCENE_SCALE}|{self.num_squares}|{self.num_cells}"
+
+    def __get_checkpoint_stamp(self):
+        # unlike the cache, a checkpoint is all or nothing: any geometry change in
+        # the zone starts it over
+        scene_hash = hash_bytes(self.__get_square_fingerprints().tobytes()).hex()
+        return f"{self.__get_cache_stamp()}|{scene_hash}"
+
+    def __is_square_cached(self, sx: int, sy: int):
+        if self.__cache is None:
+            return False
+        square_idx = sx * self.num_squares + sy
+        return self.__cache.is_valid(
+            square_idx, self.__square_fingerprints[square_idx]
+        )
+
+    def save_cache(self):
+        if self.cache_path is None:
+            return
+        SquareCache.save(
+            self.cache_path,
+            self.__get_cache_stamp(),
+            self.__get_square_fingerprints(),
+            self.cells,
+        )
+
+    def __open_checkpoint(self):
+        if self.checkpoint_path is None or self.__checkpoint is not None:
+            return
+
+        self.__checkpoint = GeoCheckpoint(
+            self.checkpoint_path,
+            self.__get_checkpoint_stamp(),
+            self.num_cells * self.num_cells,
+            self.checkpoint_every,
+        )
+        stale = self.resume and os.path.exists(self.checkpoint_path)
+        self.__checkpoint.open(self.resume)
+        if stale and not self.__checkpoint.resumed:
+            P.print(
+                f"RESUME > Zone ({self.pos.x}:{self.pos.y}) | {self.checkpoint_path} does not match the scene, starting over"
+            )
+
+        done_z = len(self.__checkpoint.done[PHASE_Z])
+        done_h = len(self.__checkpoint.done[PHASE_H])
+        if done_z + done_h != 0:
+            P.print(
+                f"RESUME > Zone ({self.pos.x}:{self.pos.y}) | {done_z} Z squares, {done_h} H squares"
+            )
+
+    def __is_square_checkpointed(self, phase: int, square_idx: int):
+        return self.__checkpoint is not None and self.__checkpoint.is_done(
+            phase, square_idx
+        )
+
+    def __checkpoint_square(self, phase: int, square_idx: int):
+        if self.__checkpoint is not None:
+            self.__checkpoint.add_square(phase, square_idx, self.cells)
+
+    def close_checkpoint(self, remove: bool = False):
+        if self.__checkpoint is not None:
+            self.__checkpoint.close()
+            self.__checkpoint = None
+        if remove and self.checkpoint_path is not None:
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+
+    def __print_empty_squares(self, empty: int):
+        if empty != 0:
+            P.print(
+                f"Missed {empty} empty squares ({empty * self.num_cells * self.num_cells} cells) in zone ({self.pos.x}:{self.pos.y})"
+            )
 
     def generate_cells(self):
         T.start()
 
-        self.volumes = {}  # cell_idx : z_values
-        self.wrapped = {}  # cell_idx : neg_z_value
+        # cell_idx : z_values, wrapped and heights, appended in cell order
+        self.cells = CellVolumes(len(self.grid), self.num_cells * self.num_cells)
+
+        caster = self.__get_caster()
+        self.__load_cache()
+        self.__open_checkpoint()
 
         # raycast
+        empty = 0
         for sx in range(self.num_squares):
             for sy in range(self.num_squares):
-                for cx in range(self.num_cells):
-                    for cy in range(self.num_cells):
-                        cell_abs_pos = self.__get_cell_pos(sx, sy, cx, cy)
-                        cell_idx = self.__get_cell_index(sx, sy, cx, cy)
-
-                        hidden_objects = []
-                        z_cast = self.max_height
-                        while True:
-                            result, z, obj = self.__raycast(
-                                cell_abs_pos.x, cell_abs_pos.y, z_cast
+                square_idx = sx * self.num_squares + sy
+                if self.__is_square_cached(sx, sy):
+                    self.__cache.restore_square(square_idx, self.cells)
+                elif self.__is_square_checkpointed(PHASE_Z, square_idx):
+                    self.__checkpoint.restore_square(PHASE_Z, square_idx, self.cells)
+                elif len(self.__get_square_candidates(sx, sy)) == 0:
+                    empty += 1
+                else:
+                    candidates = self.__get_square_candidates(sx, sy)
+                    cells = self.grid.square_cells(sx, sy)
+                    xs = self.grid.x[cells].tolist()
+                    ys = self.grid.y[cells].tolist()
+                    for i in range(len(xs)):
+                        hits = caster.cast_column(
+                            xs[i], ys[i], self.max_height, candidates
+                        )
+                        if len(hits) != 0:
+                            self.cells.append(
+                                cells.start + i,
+                                *merge_column_hits([z for z, obj_idx in hits]),
+                            )
+                        else:
+                            cx, cy = divmod(i, self.num_cells)
+                            P.print(
+                                f"Missed ({sx},{sy})->({cx},{cy}) | ({xs[i]} : {ys[i]})"
                             )
-                            wrap = 0
-                            if result:
-                                if z < 0:
-                                    wrap = z
-                                    z = MAX_Z + z
-
-                                if cell_idx in self.volumes:
-                                    if (
-                                        self.volumes[cell_idx][
-                                            len(self.volumes[cell_idx]) - 1
-                                        ]
-                                        - z
-                                        > 1
-                                    ):
-                                        self.volumes[cell_idx].append(z)
-                                        self.wrapped[cell_idx].append(wrap)
-                                else:
-                                    self.volumes[cell_idx] = [z]
-                                    self.wrapped[cell_idx] = [wrap]
-
-                                # z_cast = z - 0.001
-                                obj.hide_set(True)
-                                hidden_objects.append(obj)
-
-                            else:
-                                if cell_idx not in self.volumes:
-                                    P.print(
-                                        f"Missed ({sx},{sy})->({cx},{cy}) | ({cell_abs_pos.x} : {cell_abs_pos.y})"
-                                    )
-                                # todo: add point if missed? for dungeons with no terrain
-                                for hidden in hidden_objects:
-                                    hidden.hide_set(False)
-
-                                break
+                            # todo: add point if missed? for dungeons with no terrain
+
+                    self.__checkpoint_square(PHASE_Z, square_idx)
 
                 squares_per_sec = T.get_iterations_per_sec()
                 squares_done = sy + (sx * self.num_squares)
@@ -235,66 +355,164 @@ class GeoGenerator:
                     f'RAYCAST Z > Zone ({self.pos.x}:{self.pos.y}) | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
                 )
 
+        self.cells.trim()
+        self.__print_empty_squares(empty)
+
         # sort
+        start = time.time()
+        self.cells.sort()
+        P.print(
+            f"SORT > Zone ({self.pos.x}:{self.pos.y}) | {len(self.cells)} volumes | {time.time() - start:.2f} s"
+        )
+
+    def generate_fused(self):
+        # volumes and heights in one sweep per cell: the ceiling of a volume is the
+        # next hit above it in the column, cast up only when that is ambiguous
         T.start()
+
+        self.cells = CellVolumes(len(self.grid), self.num_cells * self.num_cells)
+
+        caster = self.__get_caster()
+        self.__load_cache()
+        self.__open_checkpoint()
+
+        ambiguous = 0
+        empty = 0
         for sx in range(self.num_squares):
             for sy in range(self.num_squares):
-                for cx in range(self.num_cells):
-                    for cy in range(self.num_cells):
-                        cell_idx = self.__get_cell_index(sx, sy, cx, cy)
-                        if cell_idx in self.volumes:
-                            self.volumes[cell_idx].sort()
-                            self.wrapped[cell_idx].sort()
+                square_idx = sx * self.num_squares + sy
+                if self.__is_square_cached(sx, sy):
+                    self.__cache.restore_square(square_idx, self.cells)
+                elif self.__is_square_checkpointed(
+                    PHASE_Z, square_idx
+                ) and self.__is_square_checkpointed(PHASE_H, square_idx):
+                    self.__checkpoint.restore_square(PHASE_Z, square_idx, self.cells)
+                    self.__checkpoint.restore_square(PHASE_H, square_idx, self.cells)
+                elif len(self.__get_square_candidates(sx, sy)) == 0:
+                    empty += 1
+                else:
+                    candidates = self.__get_square_candidates(sx, sy)
+                    cells = self.grid.square_cells(sx, sy)
+                    xs = self.grid.x[cells].tolist()
+                    ys = self.grid.y[cells].tolist()
+                    for c in range(len(xs)):
+                        hits = caster.sweep_column(xs[c], ys[c], candidates)
+                        z_values, w_values = column_volumes(hits, self.max_height)
+                        if len(z_values) == 0:
+                            cx, cy = divmod(c, self.num_cells)
+                            P.print(
+                                f"Missed ({sx},{sy})->({cx},{cy}) | ({xs[c]} : {ys[c]})"
+                            )
+                            continue
+
+                        column = [z for z, obj_idx in reversed(hits)]
+                        h_values = []
+                        for i in range(len(z_values)):
+                            z = z_values[i]
+                            if w_values[i] != 0:
+                                z -= MAX_Z
+
+                            unsure, found_z = column_ceiling(column, z)
+                            if unsure:
+                                ambiguous += 1
+                                result, found_z, obj = self.__raycast(
+                                    xs[c], ys[c], z + 0.001, 1, candidates
+                                )
+                                if not result:
+                                    found_z = None
+
+                            h_values.append(cell_height(z, found_z))
+
+                        self.cells.append(cells.start + c, z_values, w_values, h_values)
+
+                    self.__checkpoint_square(PHASE_Z, square_idx)
+                    self.__checkpoint_square(PHASE_H, square_idx)
 
                 squares_per_sec = T.get_iterations_per_sec()
                 squares_done = sy + (sx * self.num_squares)
                 squares_left = math.pow(self.num_squares, 2) - squares_done
                 time_left = squares_left / squares_per_sec
                 P.reprint(
-                    f'SORT > Zone ({self.pos.x}:{self.pos.y}) | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
+                    f'RAYCAST Z+H > Zone ({self.pos.x}:{self.pos.y}) | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
                 )
 
+        self.cells.trim()
+        self.__print_empty_squares(empty)
+        if ambiguous != 0:
+            P.print(
+                f"RAYCAST Z+H > Zone ({self.pos.x}:{self.pos.y}) | {ambiguous} ceilings cast up"
+            )
+
+    def generate_parallel(self, workers: int, python: str = None):
+        # raycast Z and H on the zone's triangles in a separate Python running
+        # generate_geo_headless.py: worker processes cannot be started from
+        # Blender, spawned ones would re-run the bpy script that started them
+        if python is None:
+            python = sys.executable  # Blender's bundled Python
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            soup_path = os.path.join(tmp_dir, "triangles.npz")
+            cells_path = os.path.join(tmp_dir, "cells.npz")
+            self.export_triangles(soup_path)
+
+            subprocess.run(
+                [
+                    python,
+                    HEADLESS_SCRIPT,
+                    soup_path,
+                    "--cells",
+                    cells_path,
+                    "--workers",
+                    str(workers),
+                ],
+                check=True,
+            )
+
+            self.cells = CellVolumes.load(cells_path, self.num_cells * self.num_cells)
+
     def generate_heights(self):
         T.start()
-        self.heights = {}
+        self.__open_checkpoint()
+        offsets = self.cells.offsets
         for sx in range(self.num_squares):
             for sy in range(self.num_squares):
-                for cx in range(self.num_cells):
-                    for cy in range(self.num_cells):
-                        cell_idx = self.__get_cell_index(sx, sy, cx, cy)
-                        if cell_idx not in self.volumes:
+                square_idx = sx * self.num_squares + sy
+                if self.__is_square_cached(sx, sy):
+                    pass  # restored along with the volumes
+                elif self.__is_square_checkpointed(PHASE_H, square_idx):
+                    self.__checkpoint.restore_square(PHASE_H, square_idx, self.cells)
+                elif len(self.__get_square_candidates(sx, sy)) == 0:
+                    pass  # nothing to cast from
+                else:
+                    candidates = self.__get_square_candidates(sx, sy)
+                    cells = self.grid.square_cells(sx, sy)
+                    xs = self.grid.x[cells].tolist()
+                    ys = self.grid.y[cells].tolist()
+                    for c in range(len(xs)):
+                        start = offsets[cells.start + c]
+                        end = offsets[cells.start + c + 1]
+                        if start == end:
                             continue
 
-                        z_values = self.volumes[cell_idx]
-
-                        cell_pos = self.__get_cell_pos(sx, sy, cx, cy)
+                        z_values = self.cells.z[start:end].tolist()
+                        w_values = self.cells.w[start:end].tolist()
 
                         for i in range(len(z_values)):
                             z = z_values[i]
-                            w = self.wrapped[cell_idx][i]
+                            w = w_values[i]
 
                             if w != 0:
                                 z -= MAX_Z
 
                             result, found_z, obj = self.__raycast(
-                                cell_pos.x, cell_pos.y, z + 0.001, 1
+                                xs[c], ys[c], z + 0.001, 1, candidates
                             )
 
-                            if result:
-                                h = found_z - abs(z)
-                            else:
-                                h = MAX_Z / 2
-
-                            if h < 0:
-                                h += MAX_Z / 2
-
-                            if h > MAX_Z / 2:
-                                h = MAX_Z / 2
+                            self.cells.h[start + i] = cell_height(
+                                z, found_z if result else None
+                            )
 
-                            if cell_idx in self.heights:
-                                self.heights[cell_idx].append(h)
-                            else:
-                                self.heights[cell_idx] = [h]
+                    self.__checkpoint_square(PHASE_H, square_idx)
 
                 squares_per_sec = T.get_iterations_per_sec()
                 squares_done = sy + (sx * self.num_squares)
@@ -304,58 +522,54 @@ class GeoGenerator:
                     f'RAYCAST H > Zone ({self.pos.x}:{self.pos.y}) | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
                 )
 
-    def draw(self, display: str):
-        if len(self.volumes) != 0:
-            T.start()
-
-            source = self.volumes
-            if display == "h":
-                source = self.heights
-
-            volume_idx = 0
-            while True:
-                volume_name = f"x{self.pos.x}y{self.pos.y}_{volume_idx}"
-                volume_mesh = D.meshes.new(volume_name)
-                volume_obj = D.objects.new(volume_name, volume_mesh)
-
-                volume_points = []
-                for sx in range(self.num_squares):
-                    for sy in range(self.num_squares):
-                        for cx in range(self.num_cells):
-                            for cy in range(self.num_cells):
-                                cell_abs_pos = self.__get_cell_pos(sx, sy, cx, cy)
-                                cell_idx = self.__get_cell_index(sx, sy, cx, cy)
-
-                                if cell_idx in source:
-                                    volumes_in_cell = source[cell_idx]
-                                    if len(volumes_in_cell) >= volume_idx + 1:
-                                        z = volumes_in_cell[volume_idx]
-                                        w = self.wrapped[cell_idx][volume_idx]
-                                        if w != 0:
-                                            z -= MAX_Z
-                                        volume_points.append(
-                                            Vector(
-                                                (
-                                                    cell_abs_pos.x,
-                                                    cell_abs_pos.y,
-                                                    z,
-                                                )
-                                            )
-                                        )
-
-                        squares_per_sec = T.get_iterations_per_sec()
-                        squares_done = sy + (sx * self.num_squares)
-                        squares_left = math.pow(self.num_squares, 2) - squares_done
-                        time_left = squares_left / squares_per_sec
-                        P.reprint(
-                            f'DRAW > Zone ({self.pos.x}:{self.pos.y}) | Volume {volume_idx} | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
-                        )
+    def draw(self, display: str, single_mesh: bool = False):
+        # one point cloud per volume index, or a single one with a "volume" attribute
+        if len(self.cells) == 0:
+            return
+
+        start = time.time()
+
+        source = self.cells.z
+        if display == "h":
+            source = self.cells.h
+
+        cell_ids = self.cells.value_cells()
+        volume_ids = self.cells.volume_indices()
+
+        points = np.empty((len(self.cells), 3), dtype=np.float32)
+        points[:, 0] = self.grid.x[cell_ids]
+        points[:, 1] = self.grid.y[cell_ids]
+        points[:, 2] = source[: len(self.cells)] - np.where(
+            self.cells.w[: len(self.cells)] != 0, MAX_Z, 0
+        )
+
+        if single_mesh:
+            self.__draw_points(f"x{self.pos.x}y{self.pos.y}", points, volume_ids)
+            num_volumes = int(volume_ids.max()) + 1
+        else:
+            # stable: every volume keeps its points in cell order
+            order = np.argsort(volume_ids, kind="stable")
+            sizes = np.bincount(volume_ids)
+            num_volumes = len(sizes)
+            for volume_idx, volume_points in enumerate(
+                np.split(points[order], np.cumsum(sizes)[:-1])
+            ):
+                self.__draw_points(f"x{self.pos.x}y{self.pos.y}_{volume_idx}", volume_points)
+
+        P.print(
+            f"DRAW > Zone ({self.pos.x}:{self.pos.y}) | {len(self.cells)} points in {num_volumes} volumes | {time.time() - start:.2f} s"
+        )
+
+    def __draw_points(self, name: str, points, volume_ids=None):
+        mesh = D.meshes.new(name)
+        mesh.vertices.add(len(points))
+        mesh.vertices.foreach_set("co", points.ravel())
+        if volume_ids is not None:
+            attribute = mesh.attributes.new("volume", "INT", "POINT")
+            attribute.data.foreach_set("value", volume_ids.astype(np.int32))
+        mesh.update()
 
-                if len(volume_points) == 0:
-                    break
-                volume_mesh.from_pydata(volume_points, [], [])
-                self.__geo_coll.objects.link(volume_obj)
-                volume_idx += 1
+        self.__geo_coll.objects.link(D.objects.new(name, mesh))
 
     def cleanup(self):
         for obj in self.__excl_coll.objects:
@@ -363,54 +577,33 @@ class GeoGenerator:
             self.__src_coll.objects.link(obj)
 
         D.collections.remove(self.__excl_coll)
-        C.window.view_layer.layer_collection.children[
+        C.view_layer.layer_collection.children[
             self.__geo_coll.name
         ].exclude = False
 
     def export(self, output_path: str):
-        # todo : max vol idx
-        T.start()
-        idx_file = open(f"{output_path}/x{self.pos.x}y{self.pos.y}.idx", "wb")
-        geo_file = open(f"{output_path}/x{self.pos.x}y{self.pos.y}.geo", "wb")
-        for sy in range(self.num_squares):
-            for sx in range(self.num_squares):
-                volumes_amount = 0
-                volumes_per_cell = []
-
-                for cy in range(self.num_cells):
-                    for cx in range(self.num_cells):
-                        cell_idx = self.__get_cell_index(sx, sy, cx, cy)
-                        z_values = self.volumes[cell_idx]
-                        volumes_amount += len(z_values)
-                        volumes_per_cell.append(len(z_values))
-                        for i in range(len(z_values)):
-                            z = z_values[i]
-                            h = self.heights[cell_idx][i]
-
-                            try:
-                                geo_file.write(struct.pack("H", int(z) * 25))
-                            except:
-                                P.print(f"{cell_idx} ERROR on Z:{z}")
-                            try:
-                                geo_file.write(struct.pack("H", int(h) * 25))
-                            except:
-                                P.print(f"{cell_idx} ERROR on H:{h}")
-
-                idx_file.write(struct.pack("I", volumes_amount))
-                for vpc in volumes_per_cell:
-                    idx_file.write(struct.pack("H", vpc))
-
-                squares_per_sec = T.get_iterations_per_sec()
-                squares_done = sy + (sx * self.num_squares)
-                squares_left = math.pow(self.num_squares, 2) - squares_done
-                time_left = squares_left / squares_per_sec
-                P.reprint(
-                    f'EXPORT > Zone ({self.pos.x}:{self.pos.y}) | Square ({str(int(sx)).rjust(3, " ")}:{str(int(sy)).rjust(3, " ")}) | {squares_per_sec:.1f} sq/s | ETA: {Utils.time_convert(time_left)}'
-                )
-
-        idx_file.close()
-        geo_file.close()
+        export_geo(
+            output_path,
+            self.pos,
+            self.grid.export_order,
+            self.cells,
+        )
 
+    def get_triangles(self):
+        soup = TriangleSoup.from_objects(
+            self.__src_coll.all_objects, C.evaluated_depsgraph_get()
+        )
+        soup.position = self.pos
+        soup.origin = self.origin
+        soup.scene_scale = SCENE_SCALE
+        return soup
+
+    def export_triangles(self, path: str):
+        soup = self.get_triangles()
+        soup.save(path)
+        P.print(
+            f"Exported {len(soup.triangles)} triangles of {len(soup.object_names)} objects to {path}"
+        )
 
 
 
@@ -422,22 +615,50 @@ def generate_geo(
     export_path: str,
     draw_z: bool = True,
     draw_h: bool = False,
+    draw_single_mesh: bool = False,
+    workers: int = 1,
+    incremental: bool = False,
+    checkpoint: bool = True,
+    resume: bool = False,
+    fused: bool = False,
+    python: str = None,
 ):
+    # python: interpreter running generate_geo_headless.py when workers > 1,
+    # Blender's bundled one by default
     start = time.time()
     generator = GeoGenerator(map_name, map_pos, map_origin)
+    if incremental:
+        generator.cache_path = (
+            f"{export_path}/x{map_pos.x}y{map_pos.y}.geocache.npz"
+        )
+    if checkpoint or resume:
+        generator.checkpoint_path = (
+            f"{export_path}/x{map_pos.x}y{map_pos.y}.geocheckpoint"
+        )
+        generator.resume = resume
     generator.setup()
     try:
         bpy.ops.wm.redraw_timer(type="DRAW_WIN_SWAP", iterations=1)
     except:
         pass
-    generator.generate_cells()
-    generator.generate_heights()
+    if workers > 1:
+        generator.generate_parallel(workers, python)
+    elif fused:
+        generator.generate_fused()
+        generator.close_checkpoint()
+        generator.save_cache()
+    else:
+        generator.generate_cells()
+        generator.generate_heights()
+        generator.close_checkpoint()
+        generator.save_cache()
     if draw_z:
-        generator.draw("z")
+        generator.draw("z", draw_single_mesh)
     if draw_h:
-        generator.draw("h")
+        generator.draw("h", draw_single_mesh)
     generator.cleanup()
     generator.export(export_path)
+    generator.close_checkpoint(remove=True)
 
     end = time.time()
 
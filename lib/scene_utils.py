@@ -49,4 +49,4 @@ class SceneUtils:
         bpy.ops.object.select_all(action="DESELECT")
 
     def set_exclude_collection(coll_name: str, value: bool):
-        C.window.view_layer.layer_collection.children[coll_name].exclude = value
+        C.view_layer.layer_collection.children[coll_name].exclude = value
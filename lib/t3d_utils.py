@@ -1,7 +1,38 @@
+import os
+import re
+import numpy as np
 from mathutils import Vector
 
+# statements Level.read_from dispatches on, matched at the start of a stripped line
+BEGIN_ACTOR = "Begin Actor"
+ACTOR_LABEL = "ActorLabel"
+BEGIN_OBJECT = "Begin Object"
+END_OBJECT = "End Object"
+END_ACTOR = "End Actor"
+
+STATEMENT_PATTERN = re.compile(
+    "|".join(
+        re.escape(statement)
+        for statement in (BEGIN_ACTOR, ACTOR_LABEL, BEGIN_OBJECT, END_OBJECT, END_ACTOR)
+    )
+)
+
+
+# one ConvexElem of an AggGeom line: vertex and index lists up to its ElemBox
+CONVEX_ELEM_PATTERN = re.compile(r"VertexData=\((.*?)\),IndexData=\((.*?)\),ElemBox")
+VECTOR_VALUE_PATTERN = re.compile(r"=([^,()]+)")
+
 
 class T3DUtils:
+    def read_statements(file_path: str):
+        # streams (statement, line) for every stripped line of a .t3d file, statement
+        # being one of the constants above or None for property lines
+        with open(file_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                match = STATEMENT_PATTERN.match(line)
+                yield (match.group(0) if match is not None else None), line
+
     def parse_name(line:str):
         return line[line.find("Name=") + 5 : -1].replace('"', "")
 
@@ -31,6 +62,21 @@ class T3DUtils:
 
         return Vector(ret)
 
+    def parse_convex_elems(line: str):
+        # (vertices (n, 3) float64, indices int32 as written) of every ConvexElem of
+        # an AggGeom line, in one pass over it
+        for match in CONVEX_ELEM_PATTERN.finditer(line):
+            vertices = np.array(
+                VECTOR_VALUE_PATTERN.findall(match.group(1)), dtype=np.float64
+            ).reshape(-1, 3)
+            indices = np.array(
+                match.group(2).split(",") if match.group(2) != "" else [],
+                dtype=np.int32,
+            )
+            yield vertices, indices
+
     def parse_mesh_path(line: str):
         ret = line[line.find('"') :].replace('"', "").replace("'", "") + ".psk"
-        return ret.replace("/Game", "StaticMeshes\\")
+        # /Game/... -> StaticMeshes/..., with the platform's separator
+        parts = ret.replace("/Game", "StaticMeshes").split("/")
+        return os.path.join(*[part for part in parts if part != ""])
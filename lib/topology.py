@@ -1,4 +1,6 @@
+import numpy as np
 from lib.globals import ZONE_SIZE as SIZE
+from lib.globals import NUM_CELLS, NUM_SQUARES
 
 
 class Point2D:
@@ -15,8 +17,9 @@ class Point3D:
 
 
 class Volume:
-    def __init__(self, volume_idx):
+    def __init__(self, volume_idx, points=None):
         self.cells = []
+        self.points = points  # (n, 3) array, when built from ZoneData
         self.index = volume_idx
 
 
@@ -48,12 +51,125 @@ class Square:
         )
 
 
+class ZoneData:
+    # CSR layout: square i owns the entries [square_offsets[i], square_offsets[i + 1])
+    def __init__(
+        self, square_offsets, square_x, square_y, cell_x, cell_y, volume_idx, z, h
+    ):
+        self.square_offsets = square_offsets
+        self.square_x = square_x
+        self.square_y = square_y
+        self.cell_x = cell_x
+        self.cell_y = cell_y
+        self.volume_idx = volume_idx
+        self.z = z
+        self.h = h
+
+    def from_reader(reader):
+        cells_per_square = NUM_CELLS * NUM_CELLS
+        volumes_per_cell = np.asarray(reader.volumes_per_cell)
+
+        if (volumes_per_cell.sum(axis=1) != reader.geo_data_count).any():
+            raise Exception(
+                f"Invalid idx data for {reader.name}: geoDataCount does not match volumes per cell"
+            )
+
+        counts = volumes_per_cell.reshape(-1).astype(np.int64)
+        count = int(reader.square_offsets[-1])
+
+        cell_ids = np.repeat(np.arange(counts.size, dtype=np.int64), counts)
+        cell_starts = np.cumsum(counts) - counts
+        volume_idx = np.arange(count, dtype=np.int64) - np.repeat(cell_starts, counts)
+
+        square_ids = cell_ids // cells_per_square
+        local_ids = cell_ids % cells_per_square
+        geo = reader.geo[:count]
+
+        return ZoneData(
+            np.array(reader.square_offsets),
+            (square_ids % NUM_SQUARES).astype(np.uint8),
+            (square_ids // NUM_SQUARES).astype(np.uint8),
+            (local_ids % NUM_CELLS).astype(np.uint8),
+            (local_ids // NUM_CELLS).astype(np.uint8),
+            volume_idx.astype(np.uint16),
+            np.array(geo["z"], dtype=np.uint16),
+            np.array(geo["h"], dtype=np.uint16),
+        )
+
+    def __len__(self):
+        return len(self.z)
+
+    @property
+    def max_volumes(self):
+        if len(self.volume_idx) == 0:
+            return 0
+        return int(self.volume_idx.max()) + 1
+
+    @property
+    def nbytes(self):
+        return sum(
+            a.nbytes
+            for a in (
+                self.square_offsets,
+                self.square_x,
+                self.square_y,
+                self.cell_x,
+                self.cell_y,
+                self.volume_idx,
+                self.z,
+                self.h,
+            )
+        )
+
+    def volume_mask(self, volume_idx):
+        return self.volume_idx == volume_idx
+
+    def square_slice(self, sx, sy):
+        i = sy * NUM_SQUARES + sx
+        return slice(self.square_offsets[i], self.square_offsets[i + 1])
+
+    def to_squares(self):
+        square_x = self.square_x.tolist()
+        square_y = self.square_y.tolist()
+        cell_x = self.cell_x.tolist()
+        cell_y = self.cell_y.tolist()
+        volume_idx = self.volume_idx.tolist()
+        z = self.z.tolist()
+        h = self.h.tolist()
+
+        squares = []
+        for i in range(len(self.square_offsets) - 1):
+            start = int(self.square_offsets[i])
+            end = int(self.square_offsets[i + 1])
+
+            volumes_per_cell = [0] * (NUM_CELLS * NUM_CELLS)
+            for e in range(start, end):
+                volumes_per_cell[cell_y[e] * NUM_CELLS + cell_x[e]] += 1
+
+            square = Square(
+                i % NUM_SQUARES, i // NUM_SQUARES, end - start, volumes_per_cell
+            )
+            for e in range(start, end):
+                square.add_cell(Cell(cell_x[e], cell_y[e], z[e], h[e], volume_idx[e]))
+            squares.append(square)
+
+        return squares
+
+
 class Zone:
-    def __init__(self, squares, position, origin):
-        self.squares = squares
+    def __init__(self, data, position, origin):
+        self.data = data
         self.origin = origin
         self.position = position
         self.relative_position = Point2D(position.x - origin.x, position.y - origin.y)
+        self.__squares = None
+
+    @property
+    def squares(self):
+        # per-cell object view, only built for code that still walks squares
+        if self.__squares is None:
+            self.__squares = self.data.to_squares()
+        return self.__squares
 
     def contains_point(self, point2d):
         return point2d.x / SIZE in range(
@@ -0,0 +1,166 @@
+import mmap
+import os
+import shutil
+import numpy as np
+
+from lib.topology import Point2D
+from lib.topology_file import ZoneReader, IDX_DTYPE, GEO_DTYPE
+
+ARCHIVE_MAGIC = b"TTOP"
+ARCHIVE_VERSION = 2  # 2: source file mtimes per entry
+ARCHIVE_ALIGN = 16
+
+HEADER_DTYPE = np.dtype(
+    [("magic", "S4"), ("version", "<u4"), ("zone_count", "<u4"), ("reserved", "<u4")]
+)
+
+# one entry per zone, followed by the idx/geo blobs they point to
+ENTRY_DTYPE = np.dtype(
+    [
+        ("x", "<i4"),
+        ("y", "<i4"),
+        ("idx_offset", "<u8"),
+        ("idx_length", "<u8"),
+        ("geo_offset", "<u8"),
+        ("geo_length", "<u8"),
+        # mtimes of the packed x{X}y{Y}.idx/.geo, see is_current
+        ("idx_mtime_ns", "<i8"),
+        ("geo_mtime_ns", "<i8"),
+    ]
+)
+
+
+def align(offset: int):
+    return (offset + ARCHIVE_ALIGN - 1) // ARCHIVE_ALIGN * ARCHIVE_ALIGN
+
+
+class TopologyArchive:
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+
+        self.__file = open(archive_path, "rb")
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # read from a copy: no view may hold the mapping if the archive is rejected
+        header = np.frombuffer(
+            self.__map[: HEADER_DTYPE.itemsize], dtype=HEADER_DTYPE
+        )[0]
+        if header["magic"] != ARCHIVE_MAGIC or header["version"] != ARCHIVE_VERSION:
+            self.close()
+            raise Exception(
+                f"{archive_path} is not a version {ARCHIVE_VERSION} topology archive, pack it again"
+            )
+
+        self.entries = np.frombuffer(
+            self.__map,
+            dtype=ENTRY_DTYPE,
+            count=int(header["zone_count"]),
+            offset=HEADER_DTYPE.itemsize,
+        )
+        self.__zones = {
+            (int(e["x"]), int(e["y"])): i for i, e in enumerate(self.entries)
+        }
+
+    def pack(topology_dir: str, positions, archive_path: str):
+        positions = [
+            p
+            for p in positions
+            if os.path.exists(os.path.join(topology_dir, f"x{p.x}y{p.y}.idx"))
+        ]
+
+        entries = np.zeros(len(positions), dtype=ENTRY_DTYPE)
+        offset = align(HEADER_DTYPE.itemsize + entries.nbytes)
+        for i, p in enumerate(positions):
+            idx_stat = os.stat(os.path.join(topology_dir, f"x{p.x}y{p.y}.idx"))
+            geo_stat = os.stat(os.path.join(topology_dir, f"x{p.x}y{p.y}.geo"))
+
+            entries[i] = (
+                p.x,
+                p.y,
+                offset,
+                idx_stat.st_size,
+                0,
+                geo_stat.st_size,
+                idx_stat.st_mtime_ns,
+                geo_stat.st_mtime_ns,
+            )
+            idx_length = idx_stat.st_size
+            geo_length = geo_stat.st_size
+            offset = align(offset + idx_length)
+            entries[i]["geo_offset"] = offset
+            offset = align(offset + geo_length)
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (ARCHIVE_MAGIC, ARCHIVE_VERSION, len(positions), 0)
+
+        with open(archive_path, "wb") as archive:
+            archive.write(header.tobytes())
+            archive.write(entries.tobytes())
+
+            for p, entry in zip(positions, entries):
+                for ext, key in (("idx", "idx_offset"), ("geo", "geo_offset")):
+                    archive.write(b"\0" * (int(entry[key]) - archive.tell()))
+                    with open(os.path.join(topology_dir, f"x{p.x}y{p.y}.{ext}"), "rb") as src:
+                        shutil.copyfileobj(src, archive)
+
+        return len(positions)
+
+    def close(self):
+        self.entries = None
+        try:
+            self.__map.close()
+        except BufferError:
+            # zone views are still alive, e.g. held by the traceback of a zone
+            # that failed to load: the mapping goes away with the last of them
+            pass
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def positions(self):
+        return [Point2D(x, y) for x, y in self.__zones]
+
+    def contains(self, position):
+        return (position.x, position.y) in self.__zones
+
+    def is_current(self, topology_dir: str, position):
+        # whether the zone's loose .idx/.geo, when still there, are the packed ones
+        entry = self.entries[self.__zones[(position.x, position.y)]]
+        for ext in ("idx", "geo"):
+            path = os.path.join(topology_dir, f"x{position.x}y{position.y}.{ext}")
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            if (
+                stat.st_size != int(entry[f"{ext}_length"])
+                or stat.st_mtime_ns != int(entry[f"{ext}_mtime_ns"])
+            ):
+                return False
+        return True
+
+    def __view(self, offset, length, dtype):
+        return np.frombuffer(
+            self.__map, dtype=dtype, count=length // dtype.itemsize, offset=offset
+        )
+
+    def open_zone(self, position):
+        entry = self.entries[self.__zones[(position.x, position.y)]]
+        return ZoneReader(
+            self.__view(int(entry["idx_offset"]), int(entry["idx_length"]), IDX_DTYPE),
+            self.__view(int(entry["geo_offset"]), int(entry["geo_length"]), GEO_DTYPE),
+            f"{self.archive_path}:x{position.x}y{position.y}",
+        )
+
+    def unpack(self, output_dir: str):
+        for entry in self.entries:
+            name = f"x{entry['x']}y{entry['y']}"
+            for ext in ("idx", "geo"):
+                offset = int(entry[f"{ext}_offset"])
+                length = int(entry[f"{ext}_length"])
+                with open(os.path.join(output_dir, f"{name}.{ext}"), "wb") as dst:
+                    dst.write(self.__map[offset : offset + length])
@@ -0,0 +1,100 @@
+import os
+import numpy as np
+
+from lib.globals import NUM_CELLS, NUM_SQUARES
+
+CELLS_PER_SQUARE = NUM_CELLS * NUM_CELLS
+
+# .idx: one record per square, squares stored row by row (y outer, x inner)
+IDX_DTYPE = np.dtype(
+    [
+        ("geo_data_count", "<u4"),
+        ("volumes_per_cell", "<u2", (CELLS_PER_SQUARE,)),
+    ]
+)
+
+# .geo: one (z, h) pair per cell volume, in the same order as the .idx cells
+GEO_DTYPE = np.dtype([("z", "<u2"), ("h", "<u2")])
+
+
+def map_array(path: str, dtype: np.dtype):
+    # np.memmap refuses empty files
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+class ZoneReader:
+    def __init__(self, idx, geo, name: str):
+        # idx/geo: arrays of IDX_DTYPE/GEO_DTYPE, usually memory-mapped
+        self.name = name
+        self.idx = idx
+        self.geo = geo
+
+        if len(self.idx) != NUM_SQUARES * NUM_SQUARES:
+            raise Exception(
+                f"Invalid idx data for {name}: expected {NUM_SQUARES * NUM_SQUARES} squares, found {len(self.idx)}"
+            )
+
+        # square i owns geo[square_offsets[i] : square_offsets[i + 1]]
+        self.square_offsets = np.zeros(len(self.idx) + 1, dtype=np.int64)
+        np.cumsum(self.idx["geo_data_count"], out=self.square_offsets[1:])
+
+        if self.square_offsets[-1] > len(self.geo):
+            raise Exception(
+                f"Invalid geo data for {name}: expected {self.square_offsets[-1]} entries, found {len(self.geo)}"
+            )
+
+    def from_files(idx_path: str, geo_path: str):
+        return ZoneReader(
+            map_array(idx_path, IDX_DTYPE),
+            map_array(geo_path, GEO_DTYPE),
+            os.path.splitext(idx_path)[0],
+        )
+
+    def open(topology_dir: str, position):
+        name = f"x{position.x}y{position.y}"
+        return ZoneReader.from_files(
+            os.path.join(topology_dir, f"{name}.idx"),
+            os.path.join(topology_dir, f"{name}.geo"),
+        )
+
+    @property
+    def geo_data_count(self):
+        return self.idx["geo_data_count"]
+
+    @property
+    def volumes_per_cell(self):
+        return self.idx["volumes_per_cell"]
+
+    def square_index(self, sx: int, sy: int):
+        return sy * NUM_SQUARES + sx
+
+    def square(self, sx: int, sy: int):
+        i = self.square_index(sx, sy)
+        return self.geo[self.square_offsets[i] : self.square_offsets[i + 1]]
+
+
+def encode_geo_values(values):
+    # same encoding as struct.pack("H", int(v) * 25), clipped instead of raising
+    encoded = np.trunc(np.asarray(values, dtype=np.float64)).astype(np.int64) * 25
+    overflow = (encoded < 0) | (encoded > 0xFFFF)
+    return np.clip(encoded, 0, 0xFFFF).astype("<u2"), overflow
+
+
+def write_zone(idx_path: str, geo_path: str, volumes_per_cell, z, h):
+    # volumes_per_cell: (squares, 64) in file order, z/h: encoded values in file order
+    volumes_per_cell = np.asarray(volumes_per_cell).reshape(-1, CELLS_PER_SQUARE)
+
+    idx = np.zeros(len(volumes_per_cell), dtype=IDX_DTYPE)
+    idx["volumes_per_cell"] = volumes_per_cell
+    idx["geo_data_count"] = volumes_per_cell.sum(axis=1, dtype=np.uint32)
+
+    geo = np.empty(len(z), dtype=GEO_DTYPE)
+    geo["z"] = z
+    geo["h"] = h
+
+    with open(idx_path, "wb") as idx_file:
+        idx.tofile(idx_file)
+    with open(geo_path, "wb") as geo_file:
+        geo.tofile(geo_file)
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+
+from lib.globals import ZONE_SIZE, NUM_CELLS, NUM_SQUARES
+from lib.topology import Point2D
+from lib.topology_file import ZoneReader, CELLS_PER_SQUARE
+
+CELL_SIZE = ZONE_SIZE / (NUM_SQUARES * NUM_CELLS)
+
+
+class ZoneCellTable:
+    def __init__(self, reader: ZoneReader):
+        self.reader = reader
+
+        # flat per-cell tables in file order (square row by row, then cell row by row)
+        self.counts = np.asarray(reader.volumes_per_cell, dtype=np.int64).reshape(-1)
+        in_square = np.cumsum(reader.volumes_per_cell, axis=1, dtype=np.int64)
+        in_square -= reader.volumes_per_cell
+        self.offsets = (reader.square_offsets[:-1, None] + in_square).reshape(-1)
+
+    def cell_index(self, gx, gy):
+        # gx, gy: cell coordinates inside the zone, 0 .. NUM_SQUARES * NUM_CELLS
+        sx, cx = np.divmod(gx, NUM_CELLS)
+        sy, cy = np.divmod(gy, NUM_CELLS)
+        return (sy * NUM_SQUARES + sx) * CELLS_PER_SQUARE + cy * NUM_CELLS + cx
+
+
+class TopologyIndex:
+    def __init__(self, topology_dir: str, origin: Point2D = None):
+        self.topology_dir = topology_dir
+        self.origin = origin if origin is not None else Point2D(0, 0)
+        self.__tables = {}
+
+    def __get_table(self, zone_x: int, zone_y: int):
+        key = (zone_x, zone_y)
+        if key not in self.__tables:
+            table = None
+            if os.path.exists(
+                os.path.join(self.topology_dir, f"x{zone_x}y{zone_y}.idx")
+            ):
+                table = ZoneCellTable(
+                    ZoneReader.open(self.topology_dir, Point2D(zone_x, zone_y))
+                )
+            self.__tables[key] = table
+        return self.__tables[key]
+
+    def __locate(self, world_x, world_y):
+        # world coordinates are relative to the continent origin
+        gx = np.floor(np.asarray(world_x, dtype=np.float64) / CELL_SIZE).astype(np.int64)
+        gy = np.floor(np.asarray(world_y, dtype=np.float64) / CELL_SIZE).astype(np.int64)
+        zone_x, gx = np.divmod(gx, NUM_SQUARES * NUM_CELLS)
+        zone_y, gy = np.divmod(gy, NUM_SQUARES * NUM_CELLS)
+        return zone_x + self.origin.x, zone_y + self.origin.y, gx, gy
+
+    def query(self, world_x: float, world_y: float):
+        zone_x, zone_y, gx, gy = self.__locate(world_x, world_y)
+        table = self.__get_table(int(zone_x), int(zone_y))
+        if table is None:
+            return []
+
+        cell = table.cell_index(int(gx), int(gy))
+        start = table.offsets[cell]
+        pairs = table.reader.geo[start : start + table.counts[cell]]
+        return [(int(z), int(h)) for z, h in pairs.tolist()]
+
+    def query_many(self, xs, ys):
+        # returns (counts, z, h): counts[i] values per point, z/h concatenated in point order
+        zone_x, zone_y, gx, gy = self.__locate(xs, ys)
+
+        counts = np.zeros(len(gx), dtype=np.int64)
+        starts = np.zeros(len(gx), dtype=np.int64)
+        zone_ids = np.full(len(gx), -1, dtype=np.int64)
+
+        zones = np.unique(np.stack([zone_x, zone_y], axis=1), axis=0)
+        tables = []
+        for zx, zy in zones.tolist():
+            table = self.__get_table(zx, zy)
+            if table is None:
+                continue
+
+            mask = (zone_x == zx) & (zone_y == zy)
+            cells = table.cell_index(gx[mask], gy[mask])
+            counts[mask] = table.counts[cells]
+            starts[mask] = table.offsets[cells]
+            zone_ids[mask] = len(tables)
+            tables.append(table)
+
+        total = int(counts.sum())
+        z = np.empty(total, dtype=np.uint16)
+        h = np.empty(total, dtype=np.uint16)
+
+        # position of each result value inside its zone's geo array
+        point_ids = np.repeat(np.arange(len(counts)), counts)
+        value_offsets = np.cumsum(counts) - counts
+        geo_ids = starts[point_ids] + np.arange(total) - value_offsets[point_ids]
+
+        value_zones = zone_ids[point_ids]
+        for i, table in enumerate(tables):
+            mask = value_zones == i
+            pairs = table.reader.geo[geo_ids[mask]]
+            z[mask] = pairs["z"]
+            h[mask] = pairs["h"]
+
+        return counts, z, h
@@ -0,0 +1,229 @@
+import numpy as np
+
+from lib.topology import Point2D
+from lib.heightfield import HeightField, is_heightfield
+
+
+class TriangleSoup:
+    def __init__(self, triangles, object_ids, object_names, heightfields=None):
+        self.triangles = triangles  # (n, 3, 3) world space vertices
+        self.object_ids = object_ids  # (n,) index into object_names
+        self.object_names = object_names
+        self.heightfields = heightfields or []  # (object id, HeightField) of terrains
+
+        self.position = Point2D(0, 0)
+        self.origin = Point2D(0, 0)
+        self.scene_scale = 1.0
+
+    def from_objects(objects, depsgraph):
+        # evaluated (modifiers applied) world space triangles of every mesh object
+        triangles = []
+        object_ids = []
+        object_names = []
+        heightfields = []
+
+        for obj in objects:
+            if obj.type != "MESH":
+                continue
+
+            if is_heightfield(obj):
+                heightfields.append((len(object_names), HeightField.from_object(obj)))
+                object_names.append(obj.name)
+                continue
+
+            eval_obj = obj.evaluated_get(depsgraph)
+            mesh = eval_obj.to_mesh()
+            mesh.calc_loop_triangles()
+
+            co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", co)
+            tris = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+            mesh.loop_triangles.foreach_get("vertices", tris)
+
+            eval_obj.to_mesh_clear()
+
+            if len(tris) == 0:
+                continue
+
+            matrix = np.array(obj.matrix_world, dtype=np.float64)
+            world = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+            triangles.append(world[tris].reshape(-1, 3, 3))
+            object_ids.append(
+                np.full(len(tris) // 3, len(object_names), dtype=np.int32)
+            )
+            object_names.append(obj.name)
+
+        if len(triangles) == 0:
+            return TriangleSoup(
+                np.zeros((0, 3, 3)),
+                np.zeros(0, dtype=np.int32),
+                object_names,
+                heightfields,
+            )
+
+        return TriangleSoup(
+            np.concatenate(triangles),
+            np.concatenate(object_ids),
+            object_names,
+            heightfields,
+        )
+
+    def save(self, path: str):
+        heightfield_arrays = {}
+        for i, (object_id, heightfield) in enumerate(self.heightfields):
+            heightfield_arrays.update(heightfield.save_arrays(f"heightfield{i}_"))
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                triangles=self.triangles.astype(np.float32),
+                object_ids=self.object_ids,
+                object_names=np.array(self.object_names, dtype=str),
+                position=np.array([self.position.x, self.position.y]),
+                origin=np.array([self.origin.x, self.origin.y]),
+                scene_scale=np.array(self.scene_scale),
+                heightfield_ids=np.array(
+                    [object_id for object_id, heightfield in self.heightfields],
+                    dtype=np.int32,
+                ),
+                **heightfield_arrays,
+            )
+
+    def load(path: str):
+        with np.load(path) as data:
+            ret = TriangleSoup(
+                data["triangles"].astype(np.float64),
+                data["object_ids"],
+                data["object_names"].tolist(),
+            )
+            ret.position = Point2D(*data["position"].tolist())
+            ret.origin = Point2D(*data["origin"].tolist())
+            ret.scene_scale = float(data["scene_scale"])
+            if "heightfield_ids" in data:
+                ret.heightfields = [
+                    (object_id, HeightField.load_arrays(data, f"heightfield{i}_"))
+                    for i, object_id in enumerate(data["heightfield_ids"].tolist())
+                ]
+        return ret
+
+
+class TriangleEngine:
+    # vertical ray caster over a triangle soup, bucketed in a uniform 2D grid
+    def __init__(self, soup: TriangleSoup, cell_size: float = None, max_grid: int = 2048):
+        tris = soup.triangles
+        self.object_ids = soup.object_ids
+        self.heightfields = soup.heightfields
+
+        v0 = tris[:, 0]
+        e1 = tris[:, 1] - v0
+        e2 = tris[:, 2] - v0
+        det = e1[:, 0] * e2[:, 1] - e2[:, 0] * e1[:, 1]
+
+        # triangles seen edge-on from above can't be hit by a vertical ray
+        valid = np.abs(det) > 1e-12
+        self.tri_ids = np.flatnonzero(valid)
+        self.v0 = v0[valid]
+        self.e1 = e1[valid]
+        self.e2 = e2[valid]
+        self.inv_det = 1 / det[valid]
+
+        if len(self.tri_ids) == 0:
+            self.min_xy = np.zeros(2)
+            self.cell_size = 1.0
+            self.grid_size = np.ones(2, dtype=np.int64)
+            self.grid_offsets = np.zeros(2, dtype=np.int64)
+            self.grid_tris = np.zeros(0, dtype=np.int64)
+            return
+
+        lo = tris[valid, :, :2].min(axis=1)
+        hi = tris[valid, :, :2].max(axis=1)
+        self.min_xy = lo.min(axis=0)
+        extent = np.maximum(hi.max(axis=0) - self.min_xy, 1e-6)
+
+        if cell_size is None:
+            # about two triangles per cell on average
+            cell_size = np.sqrt(extent[0] * extent[1] * 2 / len(self.tri_ids))
+        cell_size = max(cell_size, float(extent.max()) / max_grid)
+        self.cell_size = cell_size
+        self.grid_size = np.floor(extent / cell_size).astype(np.int64) + 1
+
+        # expand every triangle into the grid cells its XY bounds cover
+        c_lo = self.__grid_coords(lo)
+        c_hi = self.__grid_coords(hi)
+        span = c_hi - c_lo + 1
+        counts = span[:, 0] * span[:, 1]
+
+        owner = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        gx = c_lo[owner, 0] + local % span[owner, 0]
+        gy = c_lo[owner, 1] + local // span[owner, 0]
+        cells = gy * self.grid_size[0] + gx
+
+        order = np.argsort(cells, kind="stable")
+        self.grid_tris = owner[order]
+        self.grid_offsets = np.zeros(self.grid_size[0] * self.grid_size[1] + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(cells, minlength=len(self.grid_offsets) - 1),
+            out=self.grid_offsets[1:],
+        )
+
+    def __grid_coords(self, xy):
+        coords = np.floor((xy - self.min_xy) / self.cell_size).astype(np.int64)
+        return np.clip(coords, 0, self.grid_size - 1)
+
+    def cast_columns(self, xs, ys, z_top: float = np.inf):
+        # every intersection of the downward rays starting at (x, y, z_top)
+        # returns (counts, z, object_ids), each ray's hits sorted highest first
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        n = len(xs)
+
+        xy = np.stack([xs, ys], axis=1)
+        raw = np.floor((xy - self.min_xy) / self.cell_size).astype(np.int64)
+        inside = ((raw >= 0) & (raw < self.grid_size)).all(axis=1)
+        cells = np.where(inside, raw[:, 1] * self.grid_size[0] + raw[:, 0], 0)
+
+        starts = self.grid_offsets[cells]
+        counts = np.where(inside, self.grid_offsets[cells + 1] - starts, 0)
+
+        ray = np.repeat(np.arange(n), counts)
+        local = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        tri = self.grid_tris[starts[ray] + local]
+
+        dx = xs[ray] - self.v0[tri, 0]
+        dy = ys[ray] - self.v0[tri, 1]
+        e1 = self.e1[tri]
+        e2 = self.e2[tri]
+        u = (dx * e2[:, 1] - e2[:, 0] * dy) * self.inv_det[tri]
+        v = (e1[:, 0] * dy - e1[:, 1] * dx) * self.inv_det[tri]
+
+        eps = 1e-9
+        hit = (u >= -eps) & (v >= -eps) & (u + v <= 1 + eps)
+        z = self.v0[tri, 2] + u * e1[:, 2] + v * e2[:, 2]
+        hit &= z <= z_top
+
+        ray = ray[hit]
+        z = z[hit]
+        object_ids = self.object_ids[self.tri_ids[tri[hit]]]
+
+        # terrains hit every ray over them exactly once
+        if len(self.heightfields) != 0:
+            rays = [ray]
+            zs = [z]
+            ids = [object_ids]
+            for object_id, heightfield in self.heightfields:
+                terrain_z, inside = heightfield.sample(xs, ys)
+                inside &= terrain_z <= z_top
+                rays.append(np.flatnonzero(inside))
+                zs.append(terrain_z[inside])
+                ids.append(np.full(len(rays[-1]), object_id, dtype=object_ids.dtype))
+            ray = np.concatenate(rays)
+            z = np.concatenate(zs)
+            object_ids = np.concatenate(ids)
+
+        order = np.lexsort((-z, ray))
+        return (
+            np.bincount(ray, minlength=n),
+            z[order],
+            object_ids[order],
+        )
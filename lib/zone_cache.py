@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+
+class ZoneCache:
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__entries = OrderedDict()  # key : (stamp, data)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, stamp):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, stamp, data):
+        with self.__lock:
+            self.__remove(key)
+            if data.nbytes > self.max_bytes:
+                return
+
+            self.__entries[key] = (stamp, data)
+            self.size_bytes += data.nbytes
+
+            while self.size_bytes > self.max_bytes:
+                oldest = next(iter(self.__entries))
+                self.__remove(oldest)
+                self.evictions += 1
+
+    def get_or_load(self, key, stamp, load):
+        data = self.get(key, stamp)
+        if data is None:
+            data = load()
+            self.put(key, stamp, data)
+        return data
+
+    def __remove(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1].nbytes
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {self.evictions} evictions | {len(self.__entries)} zones, {self.size_bytes / (1024 * 1024):.1f}/{self.max_bytes / (1024 * 1024):.0f} MB"
+
+
+# lives in the lib module so it survives re-running scripts from the Blender text editor
+ZONE_CACHE = ZoneCache()